@@ -0,0 +1,92 @@
+"""
+    Per box overhead of dispatching on the box type.
+    Legacy classes repeat the former code comparing class names (isType) in the byte per byte
+    parser, the pagination and the render dispatch; they are compared to the type-keyed versions.
+"""
+import os
+
+from common import samples, best, table
+from esc2pdf import ESC_Device, PDFWriter
+from esc2pdf.boxes import TextBox, GraphicsBox, BandGraphicsBox, LineFeedBox, CarriageReturnBox, pageBreakBox
+
+class LegacyDevice(ESC_Device):
+    def process_byte(self, byte):
+        self.state = self.state.on_byte(byte, self.Boxes, self.devProperties)
+        if self.Boxes != []:
+            if self.Boxes[-1].isType('LineFeedBox'):
+                self.handlePageBreakKeywords()
+                self.boxesToFlowable()
+            elif self.Boxes[-1].isType('PageBreakBox') and self.devProperties.IgnoreFormFeed:
+                del self.Boxes[-1]
+
+class LegacyWriter(PDFWriter):
+    def _placeFlowable(self, Flowable, keepTogether = True):
+        if self._currentPage.isEmpty() or not keepTogether:
+            pass
+        elif not self._currentPage.hasSpace(Flowable):
+            self._nextPage()
+        for box in Flowable:
+            if self._currentPage.isEmpty():
+                if box.isType('PageBreakBox'):
+                    continue
+                if box.isType('LineFeedBox'):
+                    continue
+                if box.isType('CarriageReturnBox'):
+                    continue
+            if box.isType('PageBreakBox'):
+                self._nextPage()
+            else:
+                if box.isType('BandGraphicsBox') and not self._currentPage.isEmpty():
+                    if not self._currentPage.hasSpace( [box] ):
+                        self._nextPage()
+                self._currentPage.addBoxes( [box] )
+                if ( not self._currentPage.hasSpace( [] ) ):
+                    self._nextPage()
+
+def noop(Box):
+    pass
+
+def legacyPrintBox(Box):
+    if Box.isType('TextBox'):
+        noop(Box)
+    elif Box.isType('LineFeedBox'):
+        noop(Box)
+    elif Box.isType('CarriageReturnBox'):
+        noop(Box)
+    elif Box.isType('GraphicsBox'):
+        noop(Box)
+    elif Box.isType('BandGraphicsBox'):
+        noop(Box)
+
+printers = {TextBox: noop, LineFeedBox: noop, CarriageReturnBox: noop, GraphicsBox: noop, BandGraphicsBox: noop}
+
+def printBox(Box):
+    printer = printers.get(type(Box))
+    if printer is not None:
+        printer(Box)
+
+def parse(DeviceClass, data):
+    ESCdevice = DeviceClass()
+    ESCdevice.setParserEngine('Reference')
+    return ESCdevice.process_bytearray(data)
+
+def paginate(WriterClass, Flowable):
+    PDF = WriterClass(os.devnull, scaling=0.85)
+    PDF.addFlowable(Flowable)
+    return PDF.getPageNumbers()
+
+def render(dispatch, Flowable):
+    for Box in Flowable:
+        dispatch(Box)
+
+print('Times as legacy / new')
+report = table(('File', 30, '{}'), ('Bytes', 8, '{}'), ('Boxes', 8, '{}'), ('parse [us/byte]', 18, '{:.2f} / {:.2f}'),
+               ('paginate [us/box]', 20, '{:.2f} / {:.2f}'), ('dispatch [ns/box]', 20, '{:.0f} / {:.0f}'))
+for file, data in samples():
+    Flowable = parse(ESC_Device, data) + [pageBreakBox]
+    assert paginate(LegacyWriter, Flowable) == paginate(PDFWriter, Flowable)
+    n = len(Flowable)
+    parseTimes = tuple( best(parse, DeviceClass, data) / len(data) * 1e6 for DeviceClass in (LegacyDevice, ESC_Device) )
+    pageTimes = tuple( best(paginate, WriterClass, Flowable) / n * 1e6 for WriterClass in (LegacyWriter, PDFWriter) )
+    dispatchTimes = tuple( best(render, dispatch, Flowable) / n * 1e9 for dispatch in (legacyPrintBox, printBox) )
+    report.row(file, len(data), n, parseTimes, pageTimes, dispatchTimes)
@@ -0,0 +1,45 @@
+"""
+    Parse time with many pagebreak keywords.
+    The former search (every keyword in every TextBox of the line) is compared to the
+    combined pattern searched once per line. Keywords are sample IDs which mostly do not occur,
+    plus two which do. Both must produce the same boxes.
+"""
+from common import samples, best, table
+from esc2pdf import ESC_Device
+from esc2pdf.boxes import TextBox, pageBreakBox, fingerprint
+
+repeat = 10
+keywords = ['Sample %d:' % n for n in range(1000, 1040)] + ['CPM', 'Protocol']
+
+class LegacyDevice(ESC_Device):
+    def handlePageBreakKeywords(self):
+        if self.devProperties.PageBreakKeywords != []:
+            i = 0
+            for Box in self.Boxes:
+                if type(Box) is TextBox:
+                    for Keyword in self.devProperties.PageBreakKeywords:
+                        if Keyword in Box.Text:
+                            if self.devProperties.KeywordPagebreakeInsert == 'Before':
+                                self.Boxes.insert(i, pageBreakBox )
+                                return
+                            else:
+                                self.Boxes.insert(i+1, pageBreakBox )
+                                return
+                i += 1
+
+def parse(DeviceClass, data, words):
+    ESCdevice = DeviceClass()
+    ESCdevice.setPageBreakKeywords(words)
+    return ESCdevice.process_bytearray(data)
+
+print('{} keywords'.format(len(keywords)))
+report = table(('File', 30, '{}'), ('Lines', 8, '{}'), ('none [ms]', 16, '{:.2f}'), ('legacy [ms]', 16, '{:.2f}'),
+               ('pattern [ms]', 16, '{:.2f}'))
+for file, data in samples():
+    Flowable = parse(ESC_Device, data, keywords)
+    assert list(map(fingerprint, Flowable)) == list(map(fingerprint, parse(LegacyDevice, data, keywords)))
+    lines = sum( 1 for box in Flowable if box.isType('LineFeedBox') )
+    none = best(parse, ESC_Device, data, [], repeat = repeat)
+    legacy = best(parse, LegacyDevice, data, keywords, repeat = repeat)
+    pattern = best(parse, ESC_Device, data, keywords, repeat = repeat)
+    report.row(file, lines, none * 1e3, legacy * 1e3, pattern * 1e3)
@@ -0,0 +1,22 @@
+"""
+    Peak memory of parsing and paginating the sample binaries.
+    Every file is converted to a Flowable and put to pages, which keeps all boxes alive
+    as they are during printPDF(). Memory is traced with tracemalloc, rendering is not included.
+"""
+import os
+
+from common import samples, peakMemory, table
+from esc2pdf import ESC_Device, PDFWriter
+
+repetitions = 10 # Each file is parsed several times to simulate long reports
+
+def paginate(data):
+    PDF = PDFWriter(os.devnull, scaling=0.85)
+    Flowable = ESC_Device().process_bytearray(data)
+    PDF.addFlowable(Flowable)
+    return len(Flowable), PDF.getPageNumbers()
+
+report = table(('File', 30, '{}'), ('Boxes', 10, '{}'), ('Pages', 12, '{}'), ('Peak [kB]', 14, '{:.0f}'), ('Bytes/box', 12, '{:.0f}'))
+for file, data in samples():
+    peak, (boxes, pages) = peakMemory(paginate, data * repetitions)
+    report.row(file, boxes, pages, peak / 1e3, peak / boxes)
@@ -0,0 +1,44 @@
+"""
+    Benchmark of pagination (PDFWriter._createPages) over all sample binaries concatenated
+    several times. The page fill is compared to re-summing all boxes of a page after every
+    added box, as HighLevelPage did before. Time per box must stay constant for a linear pagination.
+"""
+import os
+import time
+
+from common import allSamples, table
+from esc2pdf import ESC_Device, PDFWriter
+from esc2pdf.pdfwriter import HighLevelPage
+
+repetitions = [1, 4, 16]
+
+class LegacyPage(HighLevelPage):
+    # Re-sums the linespaces of all boxes on every call
+    def _size(self):
+        return self._Fsize(self.Boxes)
+
+class LegacyWriter(PDFWriter):
+    def _nextPage(self):
+        self._Pages.append( LegacyPage(self._scaling) )
+        self._currentPage = self._Pages[-1]
+
+def paginate(Writer, Flowables):
+    PDF = Writer(os.devnull, scaling=0.85)
+    for Flowable in Flowables:
+        PDF.addFlowable(Flowable)
+    start = time.perf_counter()
+    PDF._createPages()
+    return time.perf_counter() - start, len(PDF._Pages)
+
+data = allSamples()
+
+report = table(('Repeat', 8, '{}'), ('Boxes', 10, '{}'), ('Pages', 8, '{}'), ('legacy [s]', 14, '{:.3f}'), ('running [s]', 14, '{:.3f}'),
+               ('legacy [us/box]', 17, '{:.2f}'), ('running [us/box]', 17, '{:.2f}'))
+for n in repetitions:
+    ESCdevice = ESC_Device()
+    Flowables = [ESCdevice.process_bytearray(data) for i in range(n)]
+    nBoxes = sum(len(Flowable) for Flowable in Flowables)
+    legacy, pagesLegacy = paginate(LegacyWriter, Flowables)
+    running, pages = paginate(PDFWriter, Flowables)
+    assert pages == pagesLegacy # Same pagination
+    report.row(n, nBoxes, pages, legacy, running, legacy / nBoxes * 1e6, running / nBoxes * 1e6)
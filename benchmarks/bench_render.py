@@ -0,0 +1,65 @@
+"""
+    Renderer throughput (PDFWriter.printPDF of parsed Flowables) on the sample binaries.
+    The legacy document draws every TextBox with drawString() (one text object per box), measures it
+    with pdfmetrics.stringWidth() and calls setFont() for each changed font property. It is compared to
+    one text object per line, cached text widths and at most one font switch per box.
+    Every run starts without the text widths and graphics forms cached by earlier runs.
+"""
+import contextlib
+import io
+import os
+import tempfile
+
+from common import samples, best, clearCaches, table
+from esc2pdf import ESC_Device, PDFWriter
+from esc2pdf import pdfwriter
+from esc2pdf.pdfengine import pdfDoc
+from reportlab.pdfbase import pdfmetrics
+
+outFile = os.path.join(tempfile.gettempdir(), 'bench_render.pdf')
+
+class LegacyDoc(pdfDoc):
+    def _printText(self, Box):
+        self._flushBitImage()
+        BoxFontSize = Box.FontSize * self._scaling
+        if BoxFontSize != self._FontSize:
+            self._FontSize = BoxFontSize
+            self._redefineFont()
+        if Box.boldFont != self._bold:
+            self._bold = Box.boldFont
+            self._redefineFont()
+        if Box.italicFont != self._italic:
+            self._italic = Box.italicFont
+            self._redefineFont()
+        self._pdfCanvas.drawString(self._Cursor.x, self._Cursor.y, Box.Text)
+        self._moveTextWidth(Box.Text)
+
+    def _moveTextWidth(self, Text):
+        textWidth = pdfmetrics.stringWidth(Text, self._Font, self._FontSize)
+        self._Cursor.move(textWidth, 0)
+
+class LegacyWriter(PDFWriter):
+    def _pdfSetup(self, *args, **kwargs):
+        pdfwriter.pdfDoc = LegacyDoc
+        try:
+            super()._pdfSetup(*args, **kwargs)
+        finally:
+            pdfwriter.pdfDoc = pdfDoc
+
+def render(WriterClass, Flowable):
+    clearCaches()
+    PDF = WriterClass(outFile, scaling=0.85)
+    PDF.addFlowable(Flowable)
+    with contextlib.redirect_stdout( io.StringIO() ): # Margin warnings
+        PDF.printPDF()
+    return PDF.getPageNumbers()
+
+print('Rates as legacy / new')
+report = table(('File', 30, '{}'), ('Boxes', 8, '{}'), ('Pages', 8, '{}'), ('boxes/s', 22, '{:.0f} / {:.0f}'),
+               ('pages/s', 22, '{:.1f} / {:.1f}'))
+for file, data in samples():
+    Flowable = ESC_Device().process_bytearray(data)
+    pages = render(PDFWriter, Flowable)
+    times = [best(render, WriterClass, Flowable) for WriterClass in (LegacyWriter, PDFWriter)]
+    report.row(file, len(Flowable), pages, tuple( len(Flowable) / t for t in times ), tuple( pages / t for t in times ))
+os.remove(outFile)
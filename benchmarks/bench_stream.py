@@ -0,0 +1,58 @@
+"""
+    PDFWriter.printStream() compared to parsing all data first and calling printPDF(), on a long job made
+    of the sample binaries. Reported: total time, time until the first page is rendered, and peak memory
+    (traced with tracemalloc in a separate run, as tracing slows down everything).
+    The stages of printStream() are threads: with the GIL, the total time is not expected to drop.
+    Its gains are early pages and, with lazy pagination, fewer boxes in memory (reportlab still keeps the
+    content of all pages until the PDF is saved).
+"""
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+from common import allSamples, peakMemory, clearCaches, table
+from esc2pdf import ESC_Device, PDFWriter
+
+repetitions = 4 # The sample binaries are repeated to get a long job
+repeat = 3
+outFile = os.path.join(tempfile.gettempdir(), 'bench_stream.pdf')
+
+data = allSamples(b'\x0c') * repetitions
+
+def sequential(PDF):
+    PDF.addFlowable(ESC_Device().process_bytearray(data))
+    PDF.printPDF()
+
+def stream(PDF):
+    PDF.printStream(ESC_Device(), io.BytesIO(data))
+
+class firstPage(object):
+    # Overlay recording when the second page is started, i.e. the first one is rendered
+    def __init__(self):
+        self.time = None
+
+    def __call__(self, canvas, pageNo):
+        if pageNo == 2 and self.time is None:
+            self.time = time.perf_counter()
+
+def run(convert, lazy):
+    clearCaches()
+    PDF = PDFWriter(outFile, scaling=0.85)
+    PDF.setPageCache(0)
+    PDF.setLazyPagination(lazy)
+    PDF.overlay = firstPage()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        convert(PDF)
+    return time.perf_counter() - start, PDF.overlay.time - start
+
+print('{} bytes, page cache off'.format(len(data)))
+report = table(('Mode', 30, '{}'), ('Total [s]', 12, '{:.2f}'), ('First page [s]', 18, '{:.2f}'), ('Peak [MB]', 14, '{:.1f}'))
+for name, convert, lazy in [('sequential', sequential, False), ('printStream', stream, False),
+                            ('sequential, lazy', sequential, True), ('printStream, lazy', stream, True)]:
+    times = [ run(convert, lazy) for i in range(repeat) ]
+    total = min( t[0] for t in times )
+    first = min( t[1] for t in times )
+    report.row(name, total, first, peakMemory(run, convert, lazy)[0] / 1e6)
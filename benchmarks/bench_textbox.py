@@ -0,0 +1,55 @@
+"""
+    Micro-benchmark of text accumulation in TextBox.
+    Every sample binary is parsed once to collect its text runs. The runs are then
+    stored byte per byte (as the Reference engine does) and run per run (as the Bulk engine does)
+    into a TextBox and compared to decoding and concatenating every single byte.
+"""
+from common import samples, best, table
+from esc2pdf import ESC_Device
+from esc2pdf.boxes import TextBox
+
+class LegacyTextBox(object):
+    # Per-byte decoding and string concatenation, as TextBox did before
+    def __init__(self, code):
+        self.Text = ''
+        self.charCode = code
+
+    def add(self, byte):
+        self.Text += byte.decode(self.charCode, errors='replace')
+
+def textRuns(data):
+    ESCdevice = ESC_Device()
+    Flowable = ESCdevice.process_bytearray(data)
+    return [box.Text.encode(box.charCode, errors='replace') for box in Flowable if box.isType('TextBox')]
+
+def perByte(BoxClass, runs, code):
+    for run in runs:
+        box = BoxClass(code)
+        for i in range(len(run)):
+            box.add(run[i:i+1])
+        box.Text
+
+def perRun(runs, code):
+    for run in runs:
+        box = TextBox(code)
+        box.add(run)
+        box.Text
+
+report = table(('File', 30, '{}'), ('Bytes', 10, '{}'), ('legacy [ms]', 14, '{:.2f}'), ('per byte [ms]', 14, '{:.2f}'),
+               ('per run [ms]', 14, '{:.2f}'))
+for file, data in samples():
+    runs = textRuns(data)
+    nBytes = sum(len(run) for run in runs)
+    for BoxClass in (LegacyTextBox, TextBox):
+        for code in ('ibm437', 'utf-8'):
+            Box = BoxClass(code)
+            Reference = LegacyTextBox(code)
+            for run in runs:
+                for i in range(len(run)):
+                    Box.add(run[i:i+1])
+                    Reference.add(run[i:i+1])
+            assert Box.Text == Reference.Text # Lazy decoding is identical
+    legacy = best(perByte, LegacyTextBox, runs, 'ibm437')
+    byte = best(perByte, TextBox, runs, 'ibm437')
+    run = best(perRun, runs, 'ibm437')
+    report.row(file, nBytes, legacy * 1e3, byte * 1e3, run * 1e3)
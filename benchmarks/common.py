@@ -0,0 +1,63 @@
+"""
+    Helpers shared by the benchmark scripts: the sample binaries, timing, process-level caches and the
+    printed result tables. Importing it makes the esc2pdf package of this checkout importable.
+"""
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from esc2pdf import pdfengine
+
+folder = os.path.join(os.path.dirname(__file__), '..', 'examples', 'sample_binaries')
+
+def sampleFiles():
+    return sorted(os.listdir(folder))
+
+def readSample(file):
+    with open(os.path.join(folder, file), 'rb') as f:
+        return f.read()
+
+def samples():
+    # (file, data) of every sample binary, sorted by file name
+    for file in sampleFiles():
+        yield file, readSample(file)
+
+def allSamples(separator = b''):
+    # All sample binaries as one job, each one followed by separator (e.g. a form feed)
+    return b''.join( data + separator for file, data in samples() )
+
+def best(function, *args, repeat = 5):
+    # Shortest time of repeat runs in seconds
+    return min( timeit.repeat(lambda: function(*args), number = 1, repeat = repeat) )
+
+def peakMemory(function, *args):
+    # Peak of the memory traced by tracemalloc while function runs, in bytes, and its result
+    tracemalloc.start()
+    try:
+        result = function(*args)
+        return tracemalloc.get_traced_memory()[1], result
+    finally:
+        tracemalloc.stop()
+
+def clearCaches():
+    # Drop the caches kept by the process between documents, so every run renders from scratch
+    with pdfengine.graphicsFormsLock:
+        pdfengine.graphicsForms.clear()
+    pdfengine.textWidths.clear()
+
+class table(object):
+    # Result table printed row by row. columns: (title, width, format) each, the first column is left aligned.
+    # A format with several fields takes a tuple, e.g. '{:.2f} / {:.2f}' for legacy / new.
+    def __init__(self, *columns):
+        self._columns = columns
+        print( self._line( [ title for title, width, format in columns ] ) )
+
+    def row(self, *values):
+        print( self._line( [ format.format(*value) if isinstance(value, tuple) else format.format(value)
+                             for (title, width, format), value in zip(self._columns, values) ] ) )
+
+    def _line(self, cells):
+        return ''.join( cell.ljust(width) if n == 0 else cell.rjust(width)
+                        for n, (cell, (title, width, format)) in enumerate( zip(cells, self._columns) ) )
@@ -0,0 +1,151 @@
+"""
+    Benchmark suite over the sample binaries.
+    Every sample is parsed (ESC_Device.process_bytearray), paginated (PDFWriter._createPages) and
+    rendered (PDFWriter.printPDF). The largest sample is also repeated --scale times as a synthetic
+    long report. Reported: bytes/s parsed, boxes/s paginated, pages/s rendered (best of --repeat runs),
+    peak RSS and PDF size. Each case runs in a new process, so the peak RSS is the one of the case.
+    Every run starts without the graphics forms and text widths cached by the previous one.
+
+        python benchmarks/suite.py --json before.json
+        python benchmarks/suite.py --compare before.json --threshold 0.1
+
+    With --compare, the exit code is 1 if a stage of any case is slower than the baseline by more than
+    --threshold (fraction of the baseline rate).
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from common import folder, sampleFiles, readSample, clearCaches
+from esc2pdf import ESC_Device, PDFWriter
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+rates = ('bytesPerSecond', 'boxesPerSecond', 'pagesPerSecond') # parse, paginate, render
+
+def cases(scale):
+    # (name, file, repetitions)
+    files = sampleFiles()
+    result = [(file, file, 1) for file in files]
+    if scale > 1:
+        largest = max(files, key = lambda file: os.path.getsize(os.path.join(folder, file)))
+        result.append(('{} x{}'.format(largest, scale), largest, scale))
+    return result
+
+def runCase(file, repetitions, repeat):
+    data = readSample(file) * repetitions
+    outFile = os.path.join(tempfile.gettempdir(), 'esc2pdf_suite_%d.pdf' % os.getpid())
+    parseTime = paginateTime = renderTime = float('inf')
+    try:
+        with contextlib.redirect_stdout( io.StringIO() ): # Margin and overflow warnings
+            for n in range(repeat):
+                clearCaches()
+                t0 = time.perf_counter()
+                Flowable = ESC_Device().process_bytearray(data)
+                t1 = time.perf_counter()
+                PDF = PDFWriter(outFile, scaling=0.85)
+                PDF.addFlowable(Flowable)
+                PDF._createPages()
+                t2 = time.perf_counter()
+                PDF.printPDF()
+                t3 = time.perf_counter()
+                parseTime = min(parseTime, t1 - t0)
+                paginateTime = min(paginateTime, t2 - t1)
+                renderTime = min(renderTime, t3 - t2)
+        pages = PDF.getPageNumbers()
+        outputSize = os.path.getsize(outFile)
+    finally:
+        if os.path.exists(outFile):
+            os.remove(outFile)
+    return {
+        'bytes': len(data),
+        'boxes': len(Flowable),
+        'pages': pages,
+        'parseSeconds': parseTime,
+        'paginateSeconds': paginateTime,
+        'renderSeconds': renderTime,
+        'bytesPerSecond': len(data) / parseTime,
+        'boxesPerSecond': len(Flowable) / paginateTime,
+        'pagesPerSecond': pages / renderTime,
+        'peakRSS': peakRSS(),
+        'outputSize': outputSize
+        }
+
+def peakRSS():
+    # Peak resident set size of this process in bytes, None if not available
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024 # kB on Linux
+
+def commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd = os.path.dirname(os.path.abspath(__file__)),
+                              capture_output = True, text = True, check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline, threshold):
+    # Returns a list of (case, rate, baseline, current) slower than the baseline by more than threshold
+    regressions = []
+    for name, case in results['cases'].items():
+        base = baseline['cases'].get(name)
+        if base is None:
+            continue
+        for rate in rates:
+            if case[rate] < base[rate] * (1 - threshold):
+                regressions.append( (name, rate, base[rate], case[rate]) )
+    return regressions
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Benchmark parsing, pagination and rendering of the sample binaries.')
+    parser.add_argument('--repeat', type = int, default = 3, help = 'runs per case, the best is reported (default: 3)')
+    parser.add_argument('--scale', type = int, default = 100, help = 'repetitions of the largest sample (default: 100, 1: off)')
+    parser.add_argument('--json', metavar = 'FILE', help = 'write the results as JSON')
+    parser.add_argument('--compare', metavar = 'FILE', help = 'JSON results of a previous run to compare with')
+    parser.add_argument('--threshold', type = float, default = 0.1, help = 'tolerated slow down with --compare (default: 0.1)')
+    args = parser.parse_args(argv)
+
+    results = {'commit': commit(), 'python': platform.python_version(), 'platform': platform.platform(),
+               'repeat': args.repeat, 'cases': {}}
+    print('{:<36}{:>10}{:>8}{:>7}{:>14}{:>12}{:>10}{:>11}{:>11}'.format(
+        'Case', 'Bytes', 'Boxes', 'Pages', 'parse [MB/s]', 'boxes/s', 'pages/s', 'RSS [MB]', 'PDF [kB]'))
+    context = multiprocessing.get_context('spawn') # Fresh process per case for the peak RSS
+    for name, file, repetitions in cases(args.scale):
+        with ProcessPoolExecutor(max_workers = 1, mp_context = context) as executor:
+            case = executor.submit(runCase, file, repetitions, args.repeat).result()
+        results['cases'][name] = case
+        print('{:<36}{:>10}{:>8}{:>7}{:>14.2f}{:>12.0f}{:>10.1f}{:>11}{:>11.0f}'.format(
+            name, case['bytes'], case['boxes'], case['pages'], case['bytesPerSecond'] / 1e6, case['boxesPerSecond'],
+            case['pagesPerSecond'], '-' if case['peakRSS'] is None else '%.1f' % (case['peakRSS'] / 1e6), case['outputSize'] / 1e3))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent = 2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        print('Compared to {} (commit {}), threshold {:.0%}:'.format(args.compare, baseline.get('commit'), args.threshold))
+        for name, rate, base, current in regressions:
+            print('  {:<36}{:<16}{:>14.1f} -> {:.1f} ({:+.0%})'.format(name, rate, base, current, current / base - 1))
+        if regressions:
+            return 1
+        print('  no regression')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,6 +4,11 @@
 
 from .esc_p import ESC_Device
 from .pdfwriter import PDFWriter
+from .incremental import IncrementalPDFWriter
+from .ingest import IngestService
+from .escf import FlowableCache
+from .metrics import Metrics
+from .router import OutputRouter
 __version__ = '0.1'
 
-__all__ = """ESC_Device PDFWriter""".split()
\ No newline at end of file
+__all__ = """ESC_Device PDFWriter IncrementalPDFWriter IngestService FlowableCache Metrics OutputRouter""".split()
\ No newline at end of file
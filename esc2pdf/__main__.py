@@ -0,0 +1,8 @@
+# A part of esc2pdf (https://github.com/szihlmann/esc2pdf)
+# Copyright (C) 2021 Serge Zihlmann, Bern, Switzerland
+# MIT license -- See LICENSE.txt for details
+
+import sys
+from .cli import main
+
+sys.exit(main())
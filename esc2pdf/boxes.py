@@ -2,64 +2,185 @@
 # Copyright (C) 2021 Serge Zihlmann, Bern, Switzerland
 # MIT license -- See LICENSE.txt for details
 
+import codecs
+import sys
+from hashlib import md5
+
 defaultGraphicsResolutionH = 60 # DPI
 defaultGraphicsResolutionV = 72 # DPI
 
-# Blueprint for Box object
+_byteTables = {} # Per charCode: None for single-byte codecs, else a per-byte decoding table
+
+def _byteTable(code):
+    if code not in _byteTables:
+        info = codecs.lookup(code)
+        module = sys.modules.get(type(getattr(info.decode, '__self__', None)).__module__)
+        if info.name in ('iso8859-1', 'ascii') or hasattr(module, 'decoding_table'):
+            _byteTables[code] = None # Charmap codec: every byte decodes on its own anyway
+        else:
+            _byteTables[code] = [bytes([i]).decode(code, errors='replace') for i in range(256)]
+    return _byteTables[code]
+
+def decodeBytes(data, code):
+    # Decode a run of bytes exactly as if every byte was decoded on its own
+    table = _byteTable(code)
+    if table is None:
+        return codecs.decode(data, code, 'replace')
+    return ''.join([table[b] for b in data])
+
+# Blueprint for Box object. Boxes use __slots__ (no per-instance __dict__), as long reports hold many of them.
 class Box(object):
-    def __init__(self):
-        self.CmdPromptOutput = False
-        #pass
+    __slots__ = ()
 
     def Type(self):
         return self.__class__.__name__
 
     def isType(self, typeName = 'None'):
         return self.Type() == typeName
+
+    def updateHash(self, digest):
+        # Feed bytes identifying type and printed content of the box to digest (hashlib object)
+        digest.update( self.Type().encode() )
     
     def PrintToCmd(self):
         pass
 
 # Boxes for data storage
 class TextBox(Box):
+    __slots__ = ('_text', '_pending', 'charCode', 'FontSize', 'boldFont', 'italicFont', 'CmdPromptOutput')
+
     def __init__(self, code = 'ibm437', fSize = 12, bold = False, italic = False):
-        self.Text = ''
+        self._text = '' # Decoded text
+        self._pending = b'' # Raw bytes received since last decoding
         self.charCode = code
         self.FontSize = fSize
         self.boldFont = bold # By default, font is not bold
         self.italicFont = italic # By default, font is not italic
         self.CmdPromptOutput = False # By default not printing to command line
 
+    @property
+    def Text(self):
+        # Decode pending bytes on first read, once per run
+        if self._pending:
+            self._text += decodeBytes(self._pending, self.charCode)
+            self._pending = b''
+        return self._text
+
+    @Text.setter
+    def Text(self, text):
+        self._text = text
+        self._pending = b''
+
+    def updateHash(self, digest):
+        digest.update( repr( (self.Type(), self.Text, self.FontSize, self.boldFont, self.italicFont) ).encode() )
+
     def add(self, byte):
-        string = byte.decode(self.charCode, errors='replace') # Decode to text and save
-        self.Text += string
+        # Store raw, decode when Text is read. An empty buffer is the shared b'' until data arrives.
+        if self._pending:
+            self._pending += byte
+        else:
+            self._pending = bytearray(byte)
         if self.CmdPromptOutput:
-            print (string, end = '')
+            print (decodeBytes(byte, self.charCode), end = '')
 
     def PrintToCmd(self):
         self.CmdPromptOutput = True
 
 
 class GraphicsBox(Box):
+    __slots__ = ('graphicsData', 'H_resolution', 'V_resolution')
+
     def __init__(self):
         self.graphicsData = bytearray()
         self.H_resolution = defaultGraphicsResolutionH # DPI, horizontal
         self.V_resolution = defaultGraphicsResolutionV # DPI, vertical
+
+    def updateHash(self, digest):
+        digest.update( repr( (self.Type(), self.H_resolution, self.V_resolution, len(self.graphicsData)) ).encode() )
+        digest.update(self.graphicsData) # Buffers (also memoryviews of the input) are hashed without a copy
     
     def PrintToCmd(self):
         print ('{Graphics Data ' + str(len(self.graphicsData)) + ' bytes}', end = '')
 
+class BandGraphicsBox(Box):
+    # Vertically stacked graphics bands (GraphicsBox, CR, LF, GraphicsBox, ...) fused to one box
+    __slots__ = ('Bands', 'H_resolution', 'V_resolution', 'BandSpace', 'Height')
+
+    def __init__(self, gBox):
+        self.Bands = [gBox.graphicsData] # Graphics data of each band, top band first
+        self.H_resolution = gBox.H_resolution # DPI, horizontal
+        self.V_resolution = gBox.V_resolution # DPI, vertical
+        self.BandSpace = 8 * 72 / gBox.V_resolution # Linespace between bands in pts (8 dots)
+        self.Height = 0 # Sum of linespaces between first and last band in pts
+
+    def addBand(self, graphicsData):
+        self.Bands.append(graphicsData)
+        self.Height += self.BandSpace
+
+    def updateHash(self, digest):
+        header = (self.Type(), self.H_resolution, self.V_resolution, self.BandSpace, [len(band) for band in self.Bands])
+        digest.update( repr(header).encode() )
+        for band in self.Bands:
+            digest.update(band)
+
+    def bandBoxes(self):
+        # The bands as individual GraphicsBoxes
+        for graphicsData in self.Bands:
+            gBox = GraphicsBox()
+            gBox.graphicsData = graphicsData
+            gBox.H_resolution = self.H_resolution
+            gBox.V_resolution = self.V_resolution
+            yield gBox
+
+    def PrintToCmd(self):
+        print ('{Graphics Bands ' + str(len(self.Bands)) + ' x ' + str(len(self.Bands[0])) + ' bytes}', end = '')
+
 class PageBreakBox(Box):
+    __slots__ = ()
+
+    def __reduce__(self):
+        return 'pageBreakBox' # Unpickled as the shared instance
+
     def PrintToCmd(self):
         print ('{Page Break}', end = '\n')
 
 class LineFeedBox(Box):
+    __slots__ = ('LineSpace',)
+
     def __init__(self, space):
         self.LineSpace = space
 
+    def __reduce__(self):
+        return (lineFeedBox, (self.LineSpace,))
+
+    def updateHash(self, digest):
+        digest.update( repr( (self.Type(), self.LineSpace) ).encode() )
+
     def PrintToCmd(self):
         print ('{LF ' + str(self.LineSpace) + ' pts}', end = '\n')
 
 class CarriageReturnBox(Box):
+    __slots__ = ()
+
+    def __reduce__(self):
+        return 'carriageReturnBox'
+
     def PrintToCmd(self):
         print ('{CR}', end = '')
+
+# Shared instances of boxes without content. LineFeedBoxes are shared per linespace.
+# Boxes in a Flowable must therefore not be modified.
+carriageReturnBox = CarriageReturnBox()
+pageBreakBox = PageBreakBox()
+_lineFeedBoxes = {}
+
+def lineFeedBox(space):
+    if space not in _lineFeedBoxes:
+        _lineFeedBoxes[space] = LineFeedBox(space)
+    return _lineFeedBoxes[space]
+
+def fingerprint(box):
+    # Hex digest identifying type and printed content of a box
+    digest = md5()
+    box.updateHash(digest)
+    return digest.hexdigest()
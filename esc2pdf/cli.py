@@ -0,0 +1,127 @@
+# A part of esc2pdf (https://github.com/szihlmann/esc2pdf)
+# Copyright (C) 2021 Serge Zihlmann, Bern, Switzerland
+# MIT license -- See LICENSE.txt for details
+
+# Command line tool converting ESC/P captures to PDF, one PDF per input file
+import argparse
+import contextlib
+import glob
+import io
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from .esc_p import ESC_Device
+from .pdfwriter import PDFWriter
+from .escf import FlowableCache
+from .splitter import parseFileParallel
+
+def main(argv = None):
+    args = parseArguments(argv)
+    files = findInputs(args.inputs, args.pattern)
+    if not files:
+        print('No input files found.', file=sys.stderr)
+        return 2
+    collisions = outputCollisions(files, args.output_dir)
+    if collisions:
+        for pdfName, inputs in collisions.items():
+            print('Inputs ' + ', '.join(inputs) + ' would be written to the same file ' + pdfName + '.', file=sys.stderr)
+        print('Nothing converted. Rename the inputs or convert them to separate output directories.', file=sys.stderr)
+        return 2
+    parseWorkers = args.jobs if len(files) == 1 else 1 # A single file is split into segments parsed by the workers
+    jobs = [ (file, outputName(file, args.output_dir), args.scaling, args.charcode, args.cache, args.verbose, parseWorkers)
+             for file in files ]
+    workers = max(1, min(args.jobs, len(jobs)))
+    if args.output_dir is not None:
+        os.makedirs(args.output_dir, exist_ok = True)
+
+    start = time.perf_counter()
+    failed = 0
+    totalBytes = 0
+    if workers == 1:
+        results = map(convertFile, jobs)
+    else:
+        pool = ProcessPoolExecutor(max_workers = workers)
+        results = pool.map(convertFile, jobs)
+    for file, size, error in results:
+        totalBytes += size
+        if error is None:
+            if args.verbose:
+                print(file)
+        else:
+            failed += 1
+            print('Error converting ' + file + ': ' + error, file=sys.stderr)
+    if workers > 1:
+        pool.shutdown()
+    duration = max(time.perf_counter() - start, 1e-9)
+
+    print('{} of {} files converted in {:.2f} s with {} worker(s): {:.1f} files/s, {:.2f} MB/s'.format(
+        len(files) - failed, len(files), duration, workers, len(files) / duration, totalBytes / duration / 1e6))
+    return 1 if failed else 0
+
+def parseArguments(argv):
+    parser = argparse.ArgumentParser(prog = 'esc2pdf', description = 'Convert ESC/P captures to PDF, one PDF per input file.')
+    parser.add_argument('inputs', nargs = '+', help = 'Files, glob patterns or directories')
+    parser.add_argument('-o', '--output-dir', default = None, help = 'Directory for PDF files (default: next to input)')
+    parser.add_argument('-j', '--jobs', type = positiveInteger, default = os.cpu_count() or 1, help = 'Number of worker processes (default: number of cores)')
+    parser.add_argument('-p', '--pattern', default = '*.esc', help = 'File pattern used within directories (default: *.esc)')
+    parser.add_argument('-s', '--scaling', type = float, default = 0.85, help = 'Scaling factor of the PDF output (default: 0.85)')
+    parser.add_argument('-c', '--charcode', default = 'ibm437', help = 'Character code of the input (default: ibm437)')
+    parser.add_argument('--cache', default = None, help = 'Directory to keep parsed files (.escf), later runs skip parsing')
+    parser.add_argument('-v', '--verbose', action = 'store_true', help = 'List converted files and show conversion messages')
+    return parser.parse_args(argv)
+
+def positiveInteger(text):
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError('must be at least 1, got ' + text)
+    return value
+
+def findInputs(inputs, pattern):
+    # Expand directories and glob patterns to a sorted list of files without duplicates
+    files = []
+    for entry in inputs:
+        if os.path.isdir(entry):
+            files += glob.glob(os.path.join(entry, pattern))
+        elif os.path.isfile(entry):
+            files.append(entry)
+        else:
+            files += glob.glob(entry, recursive = True)
+    return sorted( set( os.path.normpath(file) for file in files if os.path.isfile(file) ) )
+
+def outputName(file, outputDir):
+    name = os.path.splitext(file)[0] + '.pdf'
+    if outputDir is not None:
+        name = os.path.join(outputDir, os.path.basename(name))
+    return name
+
+def outputCollisions(files, outputDir):
+    # Output names used by several inputs (e.g. a/job.esc and b/job.esc with -o), with their inputs
+    inputs = {}
+    for file in files:
+        pdfName = outputName(file, outputDir)
+        inputs.setdefault( os.path.normcase( os.path.abspath(pdfName) ), (pdfName, []) )[1].append(file)
+    return { pdfName: files for pdfName, files in inputs.values() if len(files) > 1 }
+
+def convertFile(job):
+    # Worker: convert one file with its own ESC_Device and PDFWriter. Returns (file, size, error or None).
+    file, pdfName, scaling, charCode, cacheDir, verbose, parseWorkers = job
+    size = 0
+    try:
+        size = os.path.getsize(file)
+        output = sys.stdout if verbose else io.StringIO() # Keep conversion warnings off the console
+        with contextlib.redirect_stdout(output):
+            ESCdevice = ESC_Device()
+            ESCdevice.setCharcode(charCode)
+            PDF = PDFWriter(pdfName, scaling = scaling)
+            if cacheDir is None and parseWorkers > 1:
+                Flowable = parseFileParallel(ESCdevice, file, parseWorkers)
+            elif cacheDir is None:
+                Flowable = ESCdevice.process_file(file)
+            else:
+                Flowable = FlowableCache(cacheDir).parse(file, ESCdevice) # Includes the last line, ESCdevice is unchanged
+            PDF.addFlowable(Flowable + ESCdevice.flush()) # Last line, if not terminated by a linefeed
+            PDF.printPDF()
+    except Exception as error:
+        return file, size, type(error).__name__ + ': ' + str(error)
+    return file, size, None
@@ -3,8 +3,19 @@
 # MIT license -- See LICENSE.txt for details
 
 # Implementation of a state machine to process ESC code data
-from .states import IDLE
-from .boxes import PageBreakBox
+import mmap
+import os
+import re
+from bisect import bisect_right
+from itertools import accumulate
+from .states import IDLE, ESC_K, idleState, escState, escCommands
+from .transitions import t_ReceiveText
+from .boxes import pageBreakBox, TextBox, LineFeedBox, PageBreakBox
+from .metrics import timed
+
+# Bytes which leave the plain text state (LF, FF, CR, ESC). Everything else is text.
+controlBytes = re.compile(b'[\x0a\x0c\x0d\x1b]')
+singleBytes = [bytes([i]) for i in range(256)] # Byte value to bytes object, for any input buffer type
 
 class deviceProperties(object):
     def __init__(self):
@@ -17,6 +28,9 @@ class deviceProperties(object):
         self.IgnoreFormFeed = False # By default, FormFeedBoxes are accepted
         self.PageBreakKeywords = [] # None per default, can be multiple
         self.KeywordPagebreakeInsert = 'Before'  # 'Before' or type anything for after
+        self.PageBreakKeywordsRegex = False # Keywords are regular expressions
+        self.KeywordPagebreakMatches = 'First' # 'First': one pagebreak per line, 'All': one per matching keyword
+        self.ParserEngine = 'Bulk' # 'Bulk' (runs of text / graphics at once) or 'Reference' (byte per byte)
 
 class BoxList (list):
     # A simple copy of the List object with an add-on, which allows debug printing when a new entry is added.
@@ -37,19 +51,85 @@ class ESC_Device(object):
 
     def __init__(self):
         # Initialize the components.
-        self.state = IDLE() # Start with IDLE state
+        self.state = idleState # Start with IDLE state
         self.Flowable = []  # Returnable Flowable. Empty list of boxes.
         self.Boxes = BoxList() # Working Flowable. Empty list of boxes (Textbox, LineFeedBox, PageBreakBox or GraphicsBox).
         self.devProperties = deviceProperties() # Initialize device properties
+        self._keywordMatcher = (None, None) # ((keywords, regex), compiled pattern), built on first use
+        self._metrics = None # Opt-in instrumentation, see setMetrics()
 
     def process_bytearray(self, array): # array is bytearray()
         self.Flowable = [] # Clear returnable flowable
         # self.Boxes is persistent
+        with timed(self._metrics, 'parse'):
+            if self.devProperties.ParserEngine == 'Reference':
+                self._process_reference(array)
+            else:
+                self._process_bulk(array)
+        if self._metrics is not None:
+            self._metrics.count('bytes', len(array))
+            self._metrics.countBoxes(self.Flowable)
+        
+        return self.Flowable # return the flowable
+
+    def process_file(self, fileName):
+        # Process a capture file without reading it into memory: the file is memory mapped and parsed from a memoryview.
+        # Graphics data of the returned Flowable are slices of the mapped file (no copy). The file stays mapped as long
+        # as they are in use and must not be changed meanwhile.
+        return self.process_bytearray( mapFile(fileName) )
+
+    def feed(self, chunk):
+        # Streaming input: process the next chunk of data (bytes, bytearray or memoryview).
+        # Returns the Flowable of lines completed by this chunk. Incomplete lines, ESC arguments
+        # and graphics data are kept in the device and continue with the next chunk.
+        return self.process_bytearray(chunk)
+
+    def process_stream(self, stream, chunkSize = 65536):
+        # Generator reading a file-like object in chunks of chunkSize bytes.
+        # Yields the Flowable completed by each chunk (empty ones are skipped). Memory use does not grow with the input.
+        while True:
+            chunk = stream.read(chunkSize)
+            if not chunk:
+                break
+            Flowable = self.feed(chunk)
+            if Flowable != []:
+                yield Flowable
+
+    def flush(self):
+        # Return boxes of the last, not terminated line as Flowable (e.g. at end of input)
+        self.Flowable = []
+        self.boxesToFlowable()
+        if self._metrics is not None:
+            self._metrics.countBoxes(self.Flowable)
+        return self.Flowable
+
+    def _process_reference(self, array):
+        # Original engine: feed the state machine byte per byte
         for byte in array:
             a_byte = byte.to_bytes(1, 'big') # convert back to byte
             self.process_byte(a_byte)
-        
-        return self.Flowable # return the flowable
+
+    def _process_bulk(self, array):
+        # Same state machine, but plain text runs and graphics payloads are consumed in one step.
+        # All other bytes (control codes, ESC arguments) go through process_byte().
+        pos = 0
+        end = len(array)
+        while pos < end:
+            state = self.state
+            if isinstance(state, IDLE):
+                match = controlBytes.search(array, pos)
+                stop = match.start() if match else end
+                if stop > pos: # Run of plain text
+                    t_ReceiveText(array[pos:stop], self.Boxes, self.devProperties)
+                    pos = stop
+                    continue
+            elif isinstance(state, ESC_K) and state.missingBytes(): # Graphics payload, slice what is available
+                chunk = array[pos:pos + state.missingBytes()]
+                self.state = state.on_payload(chunk, self.Boxes, self.devProperties)
+                pos += len(chunk)
+                continue
+            self.process_byte(singleBytes[array[pos]])
+            pos += 1
 
     def process_byte(self, byte):
         """
@@ -59,34 +139,60 @@ class ESC_Device(object):
         """
 
         # The next state will be the result of the on_byte function of the current state.
+        count = len(self.Boxes)
         self.state = self.state.on_byte(byte, self.Boxes, self.devProperties)
         
-        # Handle special cases on boxes
-        if self.Boxes != []: # if not empty
+        # Handle special cases on boxes, only if a box was appended
+        if len(self.Boxes) != count:
+            tailType = type(self.Boxes[-1])
             
             # Check for line termination and move boxes to returnable Flowable
-            if self.Boxes[-1].isType('LineFeedBox'):
+            if tailType is LineFeedBox:
                 self.handlePageBreakKeywords()
                 self.boxesToFlowable()
             
             # Remove PageBreak if user advises to ignore
-            elif self.Boxes[-1].isType('PageBreakBox') and self.devProperties.IgnoreFormFeed:
+            elif tailType is PageBreakBox and self.devProperties.IgnoreFormFeed:
                 del self.Boxes[-1] # remove Pagebreak
 
+    def _process_byte_metered(self, byte):
+        # process_byte() with metrics: counts ESC sequences by command
+        state = self.state
+        type(self).process_byte(self, byte)
+        if state is escState:
+            self._metrics.escape(byte, byte in escCommands)
+
     def handlePageBreakKeywords(self):
-        if self.devProperties.PageBreakKeywords != []:
-            i = 0
-            for Box in self.Boxes:
-                if Box.isType('TextBox'):
-                    for Keyword in self.devProperties.PageBreakKeywords:
-                        if Keyword in Box.Text:
-                            if self.devProperties.KeywordPagebreakeInsert == 'Before':
-                                self.Boxes.insert(i, PageBreakBox() )
-                                return
-                            else: # Add after
-                                self.Boxes.insert(i+1, PageBreakBox() )
-                                return
-                i += 1
+        if self.devProperties.PageBreakKeywords == []:
+            return
+        pattern = self._keywordPattern()
+
+        # Box index at which a pagebreak is inserted for every match
+        positions = []
+        for first, parts in textRuns(self.Boxes):
+            ends = None
+            for match in pattern.finditer( ''.join(parts) ):
+                if match.end() == match.start():
+                    continue # Ignore empty matches of regular expressions
+                if ends is None:
+                    ends = list( accumulate( map(len, parts) ) ) # End of the text of each box in the text of the run
+                if self.devProperties.KeywordPagebreakeInsert == 'Before':
+                    positions.append( first + bisect_right(ends, match.start()) )
+                else: # Add after
+                    positions.append( first + bisect_right(ends, match.end() - 1) + 1 )
+                if self.devProperties.KeywordPagebreakMatches == 'First':
+                    break
+            if positions and self.devProperties.KeywordPagebreakMatches == 'First':
+                break
+        for i in sorted(set(positions), reverse = True):
+            self.Boxes.insert(i, pageBreakBox )
+
+    def _keywordPattern(self):
+        # One compiled pattern for all keywords, rebuilt when the keywords or the regex setting changed
+        key = ( tuple(self.devProperties.PageBreakKeywords), self.devProperties.PageBreakKeywordsRegex )
+        if self._keywordMatcher[0] != key:
+            self._keywordMatcher = (key, keywordPattern(*key))
+        return self._keywordMatcher[1]
 
     def boxesToFlowable(self):
         # Move all boxes to returnable flowable. Clear Boxes.
@@ -103,12 +209,113 @@ class ESC_Device(object):
     def setIgnoreFormFeed(self, choice):
         self.devProperties.IgnoreFormFeed = choice
 
-    def setPageBreakKeywords(self, keywords):
+    def setPageBreakKeywords(self, keywords, regex = False):
+        # List of keywords (strings, or regular expressions if regex is True; compiled patterns are always accepted)
+        # Raises ValueError for an invalid expression, the previous keywords are kept then
+        pattern = keywordPattern(keywords, regex)
         self.devProperties.PageBreakKeywords = keywords
+        self.devProperties.PageBreakKeywordsRegex = regex
+        self._keywordMatcher = ( (tuple(keywords), regex), pattern )
 
     def setKeywordPagebreakeInsert(self, position):
         self.devProperties.KeywordPagebreakeInsert = position
+
+    def setKeywordPagebreakMatches(self, matches):
+        # 'First' (default): pagebreak at the first keyword of a line. 'All': at every keyword found in the line.
+        self.devProperties.KeywordPagebreakMatches = matches
+
+    def setParserEngine(self, engine):
+        # 'Bulk' (default) or 'Reference'. Both produce the same boxes.
+        self.devProperties.ParserEngine = engine
     
+    def setMetrics(self, metrics):
+        # Record time and counts of parsing in metrics (esc2pdf.metrics.Metrics). None (default) disables it.
+        # Metered methods replace process_byte() and handlePageBreakKeywords() of this instance only while enabled.
+        for name in ('process_byte', 'handlePageBreakKeywords'):
+            self.__dict__.pop(name, None)
+        self._metrics = metrics
+        if metrics is not None:
+            self.process_byte = self._process_byte_metered
+            self.handlePageBreakKeywords = metrics.wrap('keywords', self.handlePageBreakKeywords)
+
     def setCmdPromptOutput(self, state):
         # Print to command prompt "live" as data is received. Will make everything slow.
         self.Boxes.CmdPromptOutput = state
+
+def mapFile(fileName):
+    # Read-only memoryview of a memory mapped file (empty bytes for an empty file, which can not be mapped)
+    with open(fileName, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b''
+        return memoryview( mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) )
+
+def textRuns(Boxes):
+    # Generator of (index of the first box, texts of the boxes) for every run of adjacent TextBoxes.
+    # Keywords are searched per run: they may span TextBoxes, but never a box of another type.
+    first = None
+    for i, Box in enumerate(Boxes):
+        if type(Box) is TextBox:
+            if first is None:
+                first = i
+        elif first is not None:
+            yield first, [ Box.Text for Box in Boxes[first:i] ]
+            first = None
+    if first is not None:
+        yield first, [ Box.Text for Box in Boxes[first:] ]
+
+def keywordPattern(keywords, regex = False):
+    # Combine keywords to one regular expression, matched in a single pass over the line.
+    # Plain keywords are merged to a prefix tree, so each position of the text is rejected after one character test.
+    literals = []
+    alternatives = []
+    for keyword in keywords:
+        if isinstance(keyword, re.Pattern):
+            alternatives.append( patternSource(keyword) )
+        elif regex:
+            alternatives.append( patternSource( compileKeyword(keyword) ) )
+        else:
+            literals.append(keyword)
+    if literals:
+        alternatives.insert( 0, trieRegex(literals) )
+    return re.compile( '|'.join( '(?:' + alternative + ')' for alternative in alternatives ) )
+
+def trieRegex(words):
+    # Regular expression matching any of the words, in the form of a prefix tree
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True # A word ends here
+    return _trieNode(trie)
+
+def _trieNode(node):
+    alternatives = [ re.escape(char) + _trieNode(child) for char, child in sorted( node.items() ) if char != '' ]
+    if alternatives == []:
+        return ''
+    if len(alternatives) == 1 and '' not in node:
+        return alternatives[0]
+    group = '(?:' + '|'.join(alternatives) + ')'
+    return group + '?' if '' in node else group # Longer words are tried first
+
+def compileKeyword(keyword):
+    # Each expression is compiled on its own first: errors name the keyword, not the combined pattern
+    try:
+        return re.compile(keyword)
+    except re.error as error:
+        raise ValueError('Invalid pagebreak keyword expression ' + repr(keyword) + ': ' + str(error)) from None
+
+globalFlags = re.compile(r'\(\?[aiLmsux]+\)')
+
+def patternSource(pattern):
+    # Source of a compiled pattern with its flags as scoped inline flags.
+    # Leading global flags like (?i) are removed from the source, they are part of pattern.flags and
+    # would not be allowed inside the combined alternation.
+    source = pattern.pattern
+    match = globalFlags.match(source)
+    while match:
+        source = source[match.end():]
+        match = globalFlags.match(source)
+    letters = ''.join( letter for flag, letter in ((re.ASCII, 'a'), (re.IGNORECASE, 'i'), (re.MULTILINE, 'm'), (re.DOTALL, 's'), (re.VERBOSE, 'x'))
+                       if pattern.flags & flag )
+    return '(?' + letters + ':' + source + ')' if letters else source
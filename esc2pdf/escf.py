@@ -0,0 +1,187 @@
+# A part of esc2pdf (https://github.com/szihlmann/esc2pdf)
+# Copyright (C) 2021 Serge Zihlmann, Bern, Switzerland
+# MIT license -- See LICENSE.txt for details
+
+# Binary storage of Flowables (.escf) and a cache of parsed files, so captures are parsed only once
+import copy
+import json
+import mmap
+import os
+import struct
+from hashlib import sha256
+from .esc_p import ESC_Device, mapFile
+from .boxes import (TextBox, GraphicsBox, BandGraphicsBox, LineFeedBox, CarriageReturnBox, PageBreakBox,
+                    carriageReturnBox, pageBreakBox, lineFeedBox)
+
+# Layout of an .escf file (little endian):
+#   header      magic 'ESCF', version, box count, size of metadata
+#   metadata    JSON: character codes used by TextBoxes and user supplied information
+#   records     one fixed size record per box: opcode, flags, resolution, value, offset and length of payload
+#   arena       payloads: text (utf-8) and graphics data, referenced by the records
+# Graphics data read from a memory mapped file are memoryview slices of the file (no copy).
+escfVersion = 1
+header = struct.Struct('<4sHHII') # magic, version, reserved, box count, metadata size
+record = struct.Struct('<BBHIdQI') # opcode, flags, H resolution or charCode index, V resolution, value, offset, length
+opText, opGraphics, opBands, opLineFeed, opCarriageReturn, opPageBreak = range(6)
+flagBold = 0b01
+flagItalic = 0b10
+flagInteger = 0b100 # value (FontSize, LineSpace) is an int, not a float
+
+class escfError(Exception):
+    pass
+
+def encodeFlowable(Flowable, info = None):
+    # Returns the Flowable in .escf format. info: JSON serializable data stored with the Flowable.
+    charCodes = []
+    records = []
+    arena = bytearray()
+
+    def payload(data):
+        offset = len(arena)
+        arena.extend(data)
+        return offset, len(data)
+
+    for box in Flowable:
+        boxType = type(box)
+        if boxType is TextBox:
+            if box.charCode not in charCodes:
+                charCodes.append(box.charCode)
+            flags = (flagBold if box.boldFont else 0) | (flagItalic if box.italicFont else 0) | valueFlag(box.FontSize)
+            records.append( record.pack(opText, flags, charCodes.index(box.charCode), 0, box.FontSize,
+                                        *payload( box.Text.encode('utf-8', 'surrogatepass') )) )
+        elif boxType is GraphicsBox:
+            records.append( record.pack(opGraphics, 0, box.H_resolution, box.V_resolution, 0, *payload(box.graphicsData)) )
+        elif boxType is BandGraphicsBox:
+            table = struct.pack('<I%dI' % len(box.Bands), len(box.Bands), *[len(band) for band in box.Bands])
+            records.append( record.pack(opBands, valueFlag(box.BandSpace), box.H_resolution, box.V_resolution, box.BandSpace,
+                                        *payload( table + b''.join( bytes(band) for band in box.Bands ) )) )
+        elif boxType is LineFeedBox:
+            records.append( record.pack(opLineFeed, valueFlag(box.LineSpace), 0, 0, box.LineSpace, 0, 0) )
+        elif boxType is CarriageReturnBox:
+            records.append( record.pack(opCarriageReturn, 0, 0, 0, 0, 0, 0) )
+        elif boxType is PageBreakBox:
+            records.append( record.pack(opPageBreak, 0, 0, 0, 0, 0, 0) )
+        else:
+            raise escfError('Box type ' + box.Type() + ' can not be stored')
+
+    meta = json.dumps( {'charCodes': charCodes, 'info': info} ).encode()
+    meta += b' ' * (-len(meta) % 8) # Records start 8 byte aligned
+    return header.pack(b'ESCF', escfVersion, 0, len(records), len(meta)) + meta + b''.join(records) + arena
+
+def decodeFlowable(data):
+    # Returns (Flowable, info) from .escf data (bytes, memoryview or mmap). Graphics data are slices of data.
+    view = memoryview(data)
+    if len(view) < header.size:
+        raise escfError('File too short')
+    magic, version, _, count, metaSize = header.unpack_from(view)
+    if magic != b'ESCF':
+        raise escfError('Not an escf file')
+    if version != escfVersion:
+        raise escfError('Unsupported escf version ' + str(version))
+    meta = json.loads( bytes(view[header.size:header.size + metaSize]) )
+    charCodes = meta['charCodes']
+    start = header.size + metaSize
+    arenaStart = start + count * record.size
+    if len(view) < arenaStart:
+        raise escfError('File truncated')
+
+    Flowable = []
+    for op, flags, res, V_res, value, offset, length in record.iter_unpack(view[start:arenaStart]):
+        content = view[arenaStart + offset:arenaStart + offset + length]
+        if flags & flagInteger:
+            value = int(value)
+        if op == opText:
+            box = TextBox(charCodes[res], value, bool(flags & flagBold), bool(flags & flagItalic))
+            box.Text = str(content, 'utf-8', 'surrogatepass')
+        elif op == opGraphics:
+            box = GraphicsBox()
+            box.H_resolution = res
+            box.V_resolution = V_res
+            box.graphicsData = content
+        elif op == opBands:
+            bands = struct.unpack_from('<I', content)[0]
+            lengths = struct.unpack_from('<%dI' % bands, content, 4)
+            pos = 4 * (bands + 1)
+            gBox = GraphicsBox()
+            gBox.H_resolution = res
+            gBox.V_resolution = V_res
+            for n, bandLength in enumerate(lengths):
+                band = content[pos:pos + bandLength]
+                pos += bandLength
+                if n == 0:
+                    gBox.graphicsData = band
+                    box = BandGraphicsBox(gBox)
+                    box.BandSpace = value
+                else:
+                    box.addBand(band)
+        elif op == opLineFeed:
+            box = lineFeedBox(value)
+        elif op == opCarriageReturn:
+            box = carriageReturnBox
+        elif op == opPageBreak:
+            box = pageBreakBox
+        else:
+            raise escfError('Unknown box opcode ' + str(op))
+        Flowable.append(box)
+    return Flowable, meta['info']
+
+def valueFlag(value):
+    return flagInteger if type(value) is int else 0
+
+def writeFlowable(Flowable, fileName, info = None):
+    # Write to a temporary file first, so readers never see a partial file
+    temporary = fileName + '.tmp%d' % os.getpid()
+    with open(temporary, 'wb') as f:
+        f.write( encodeFlowable(Flowable, info) )
+    os.replace(temporary, fileName)
+
+def readFlowable(fileName):
+    # Returns (Flowable, info). The file is memory mapped; it stays mapped as long as graphics data are in use.
+    with open(fileName, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+    return decodeFlowable(data)
+
+def parserOptions(ESCdevice):
+    # Device properties which change the parsed boxes (the parser engine does not)
+    properties = dict( vars(ESCdevice.devProperties) )
+    properties.pop('ParserEngine', None)
+    return repr( sorted( properties.items() ) )
+
+class FlowableCache(object):
+    """
+        Parsed files stored as .escf in a directory. The key is the content of the file plus the
+        parser options of the device, so repeated conversions (other fonts, scaling, overlay) skip parsing.
+        parse() returns the same Flowable as process_bytearray() followed by flush() of a new device with the
+        properties of ESCdevice, i.e. including a last line without linefeed; the state of ESCdevice itself is not changed.
+    """
+    def __init__(self, directory):
+        self._directory = directory
+        os.makedirs(directory, exist_ok = True)
+        self._hits = 0
+        self._misses = 0
+
+    def parse(self, fileName, ESCdevice):
+        return self.parseBytes(mapFile(fileName), ESCdevice) # Memory mapped, not read into memory
+
+    def parseBytes(self, data, ESCdevice):
+        options = parserOptions(ESCdevice)
+        key = sha256( sha256(data).digest() + options.encode() ).hexdigest()
+        cacheFile = os.path.join(self._directory, key + '.escf')
+        if os.path.exists(cacheFile):
+            try:
+                Flowable, info = readFlowable(cacheFile)
+                if info == {'options': options, 'flushed': True}: # Older entries lack the last line
+                    self._hits += 1
+                    return Flowable
+            except (escfError, ValueError, KeyError, struct.error):
+                pass # Unreadable or outdated cache file: parse again
+
+        self._misses += 1
+        device = ESC_Device()
+        device.devProperties = copy.deepcopy(ESCdevice.devProperties)
+        Flowable = device.process_bytearray(data) + device.flush()
+        writeFlowable(Flowable, cacheFile, {'options': options, 'flushed': True})
+        return Flowable
+
+    def stats(self):
+        return {'hits': self._hits, 'misses': self._misses}
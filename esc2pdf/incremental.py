@@ -0,0 +1,162 @@
+# A part of esc2pdf (https://github.com/szihlmann/esc2pdf)
+# Copyright (C) 2021 Serge Zihlmann, Bern, Switzerland
+# MIT license -- See LICENSE.txt for details
+
+# PDFWriter for live capture: pages already written are kept in the file, new pages are appended
+import io
+import os
+import re
+from .pdfwriter import PDFWriter
+
+objHeader = re.compile(rb'(\d+) 0 obj')
+objReference = re.compile(rb'(\d+) 0 R')
+streamKeyword = re.compile(rb'stream\r?\n')
+
+class IncrementalPDFWriter(PDFWriter):
+    """
+        Writes the PDF with incremental updates. The first call of printPDF() writes a complete PDF.
+        Later calls only render pages which were added or changed since (the last page may still
+        grow) and append them to the file together with an updated page tree.
+        Replaced versions of the last page remain unused in the file until rewritePDF() is called.
+    """
+    def __init__(self, filename, scaling=1):
+        super().__init__(filename, scaling)
+        self._resetFile()
+
+    def _resetFile(self):
+        self._fileSize = None       # Size of the file written so far (None: nothing written)
+        self._xref = 0              # Offset of the last cross-reference table
+        self._trailer = {}          # Root, Info and ID of the document
+        self._objCount = 0          # Next free object number
+        self._pagesObj = 0          # Object number of the page tree
+        self._pageRefs = []         # Object number of each written PDF page
+        self._writtenState = None   # (number of pages, boxes on last page) at last write
+        self._lastPageStart = 0     # Index of the first PDF page of the last (provisional) page
+        self._lastPageFont = None   # Font state at the start of the last page
+
+    def printPDF(self):
+        self._createPages() # Put flowables to pages
+        state = ( len(self._Pages), len(self._Pages[-1].Boxes) )
+        if self._fileSize is None or not self._fileUnchanged():
+            self._writeFull()
+        elif state != self._writtenState:
+            self._writeUpdate()
+        self._writtenState = state
+
+    def rewritePDF(self):
+        # Write a complete PDF without the replaced page versions
+        self._createPages()
+        self._writeFull()
+        self._writtenState = ( len(self._Pages), len(self._Pages[-1].Boxes) )
+
+    def _fileUnchanged(self):
+        return fileSize(self._PDFfilename) == self._fileSize
+
+    def _render(self, first):
+        # Render pages from index first on into a PDF in memory. Remember where the last page starts.
+        buffer = io.BytesIO()
+        self._pdfSetup(fileName = buffer, firstPage = self._lastPageStart + 1, fontState = self._lastPageFont)
+        self._PDFdoc.countGraphics(self._Pages[first:])
+        for page in self._Pages[first:]:
+            if page is not self._Pages[first]:
+                self._PDFdoc.nextPage()
+            if page is self._Pages[-1]:
+                self._lastPageStart = self._PDFdoc.pageNumber() - 1
+                self._lastPageFont = self._PDFdoc.fontState()
+            self._printPage(page)
+        self._PDFdoc.save()
+        return buffer.getvalue()
+
+    def _writeFull(self):
+        self._resetFile()
+        data = self._render(0)
+        with open(self._PDFfilename, 'wb') as f:
+            f.write(data)
+        objects, trailer, xref = readPDF(data)
+        self._fileSize = len(data)
+        self._xref = xref
+        self._trailer = trailer
+        self._objCount = trailer['Size']
+        self._pagesObj = pageTree(objects)
+        self._pageRefs = pageKids(objects[self._pagesObj])
+
+    def _writeUpdate(self):
+        # Render the provisional last page and all new pages, append them as incremental update
+        keep = self._lastPageStart # PDF pages before the provisional page remain
+        data = self._render(self._writtenState[0] - 1)
+        objects, trailer, xref = readPDF(data)
+        skip = { trailer['Root'], trailer['Info'], pageTree(objects) }
+        mapping = { pageTree(objects): self._pagesObj }
+        for num in sorted(objects):
+            if num not in skip:
+                mapping[num] = self._objCount
+                self._objCount += 1
+        newPages = [ mapping[num] for num in pageKids(objects[pageTree(objects)]) ]
+        self._pageRefs = self._pageRefs[:keep] + newPages
+
+        update = io.BytesIO()
+        offsets = {}
+        for num in sorted(objects):
+            if num not in skip:
+                offsets[mapping[num]] = self._fileSize + update.tell()
+                update.write( renumber(objects[num], mapping) )
+        offsets[self._pagesObj] = self._fileSize + update.tell()
+        update.write( b'%d 0 obj\n<<\n/Count %d /Kids [ %s ] /Type /Pages\n>>\nendobj\n' % (
+            self._pagesObj, len(self._pageRefs), b' '.join( b'%d 0 R' % num for num in self._pageRefs ) ) )
+
+        xref = self._fileSize + update.tell()
+        update.write(b'xref\n')
+        for num in sorted(offsets): # One subsection per object keeps it simple
+            update.write( b'%d 1\n%010d 00000 n \n' % (num, offsets[num]) )
+        update.write( b'trailer\n<<\n/Info %d 0 R\n/Root %d 0 R\n/Size %d\n/Prev %d\n%s>>\nstartxref\n%d\n%%%%EOF\n' % (
+            self._trailer['Info'], self._trailer['Root'], self._objCount, self._xref, self._trailer['ID'], xref) )
+
+        with open(self._PDFfilename, 'ab') as f:
+            f.write(update.getvalue())
+        self._fileSize += len(update.getvalue())
+        self._xref = xref
+
+def fileSize(fileName):
+    try:
+        return os.path.getsize(fileName)
+    except OSError:
+        return None
+
+def readPDF(data):
+    # Split a PDF as written by reportlab into its objects {number: bytes}, trailer values and xref offset
+    xref = int( data[data.rindex(b'startxref') + 9:].split()[0] )
+    table = data[xref:data.index(b'trailer', xref)].split(b'\n')
+    count = int( table[1].split()[1] )
+    offsets = { int(line[:10]): num for num, line in enumerate(table[2:2 + count]) if line[17:18] == b'n' }
+    bounds = sorted(offsets) + [xref]
+    objects = { offsets[start]: data[start:end] for start, end in zip(bounds, bounds[1:]) }
+    trailerData = data[data.index(b'trailer', xref):]
+    trailer = {
+        'Root': int( re.search(rb'/Root (\d+) 0 R', trailerData).group(1) ),
+        'Info': int( re.search(rb'/Info (\d+) 0 R', trailerData).group(1) ),
+        'Size': int( re.search(rb'/Size (\d+)', trailerData).group(1) ),
+    }
+    ID = re.search(rb'/ID\s*(\[.*?\])', trailerData, re.S)
+    trailer['ID'] = b'/ID ' + ID.group(1) + b'\n' if ID else b''
+    return objects, trailer, xref
+
+def pageTree(objects):
+    for num, obj in objects.items():
+        if b'/Type /Pages' in dictionary(obj):
+            return num
+
+def pageKids(obj):
+    kids = re.search(rb'/Kids \[(.*?)\]', dictionary(obj), re.S).group(1)
+    return [ int(num) for num in objReference.findall(kids) ]
+
+def dictionary(obj):
+    # Object without stream data
+    match = streamKeyword.search(obj)
+    return obj[:match.start()] if match else obj
+
+def renumber(obj, mapping):
+    # Renumber object and its references outside of the stream data
+    head = dictionary(obj)
+    head = objHeader.sub(lambda m: b'%d 0 obj' % mapping[int(m.group(1))], head, count=1)
+    head = objReference.sub(lambda m: b'%d 0 R' % mapping[int(m.group(1))], head)
+    return head + obj[len(dictionary(obj)):]
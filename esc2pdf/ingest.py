@@ -0,0 +1,188 @@
+# A part of esc2pdf (https://github.com/szihlmann/esc2pdf)
+# Copyright (C) 2021 Serge Zihlmann, Bern, Switzerland
+# MIT license -- See LICENSE.txt for details
+
+# Receive ESC/P data from serial ports, TCP (raw printing, port 9100) and named pipes with asyncio
+import asyncio
+import os
+import stat
+from concurrent.futures import ThreadPoolExecutor
+from .esc_p import ESC_Device
+from .states import IDLE, CarriageReturn
+
+FormFeed = b'\x0c'
+
+class IngestService(object):
+    """
+        Receives ESC/P data from several sources concurrently. Every source has its own ESC_Device.
+        A job ends when no data arrived for idleTimeout seconds, after a form feed or when the source closes.
+        Finished jobs are passed to jobHandler(job) in a separate thread, one job after the other,
+        so slow PDF generation never blocks the readers and a single PDFWriter may be shared.
+    """
+    def __init__(self, jobHandler, idleTimeout = 5, endOnFormFeed = True, deviceSetup = None):
+        self._jobHandler = jobHandler       # Called with a printJob
+        self._idleTimeout = idleTimeout     # Seconds without data which end a job
+        self._endOnFormFeed = endOnFormFeed # A form feed ends the job
+        self._deviceSetup = deviceSetup     # Optional function configuring each new ESC_Device
+        self._sources = []
+        self._tasks = []
+        self._servers = []
+        self._pending = []                  # Jobs handed to the job thread
+        self._executor = ThreadPoolExecutor(max_workers = 1)
+        self._closing = False
+        self.chunkSize = 65536
+
+    async def serveTCP(self, host = '0.0.0.0', port = 9100):
+        # Raw printing: every connection is a source of its own. Returns the asyncio server.
+        server = await asyncio.start_server(self._handleConnection, host, port)
+        self._servers.append(server)
+        return server
+
+    async def readStream(self, reader, name = 'stream'):
+        # Any asyncio StreamReader. Returns when the stream is closed.
+        source = self._newSource(name)
+        try:
+            while True:
+                chunk = await reader.read(self.chunkSize)
+                if not chunk:
+                    break
+                self._receive(source, chunk)
+        finally:
+            self._removeSource(source)
+
+    async def readPipe(self, path, name = None):
+        # Named pipe (FIFO), pty or other character device (POSIX). A FIFO is opened for reading and writing,
+        # so it remains open while no writer is connected.
+        mode = os.O_RDWR if stat.S_ISFIFO(os.stat(path).st_mode) else os.O_RDONLY
+        pipe = os.fdopen(os.open(path, mode | os.O_NONBLOCK), 'rb', 0)
+        reader = asyncio.StreamReader()
+        protocol = asyncio.StreamReaderProtocol(reader)
+        transport, _ = await asyncio.get_running_loop().connect_read_pipe(lambda: protocol, pipe)
+        try:
+            await self.readStream(reader, name or path)
+        finally:
+            transport.close()
+
+    async def readSerial(self, connection, name = 'serial'):
+        # pyserial compatible connection. Reading is done in a thread, set a read timeout on the connection.
+        loop = asyncio.get_running_loop()
+        source = self._newSource(name)
+        try:
+            while not self._closing:
+                chunk = await loop.run_in_executor(None, serialRead, connection)
+                if chunk:
+                    self._receive(source, chunk)
+        finally:
+            self._removeSource(source)
+
+    def addSource(self, coroutine):
+        # Run a reader coroutine (e.g. readSerial(...)) as task of the service
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.append(task)
+        return task
+
+    async def close(self):
+        # Stop all readers, finish pending jobs and wait until the job thread is done
+        self._closing = True
+        for server in self._servers:
+            server.close()
+        for task in self._tasks:
+            task.cancel() # Readers end the current job of their source
+        await asyncio.gather(*self._tasks, return_exceptions = True)
+        for server in self._servers:
+            await server.wait_closed()
+        await asyncio.gather(*self._pending, return_exceptions = True)
+        self._executor.shutdown()
+
+    def _newSource(self, name):
+        device = ESC_Device()
+        if self._deviceSetup is not None:
+            self._deviceSetup(device)
+        source = inputSource(name, device)
+        self._sources.append(source)
+        return source
+
+    def _removeSource(self, source):
+        self._endJob(source, 'closed')
+        self._sources.remove(source)
+
+    async def _handleConnection(self, reader, writer):
+        name = 'tcp:%s:%s' % writer.get_extra_info('peername')[:2]
+        task = asyncio.current_task()
+        self._tasks.append(task)
+        try:
+            await self.readStream(reader, name)
+        finally:
+            writer.close()
+            self._tasks.remove(task)
+
+    def _receive(self, source, chunk):
+        # Feed chunk to the device of the source. Form feeds outside of ESC sequences and graphics data end the job.
+        pos = 0
+        if self._endOnFormFeed:
+            index = chunk.find(FormFeed)
+            while index >= 0:
+                source.add(chunk[pos:index])
+                isText = isinstance(source.device.state, (IDLE, CarriageReturn))
+                source.add(chunk[index:index + 1])
+                pos = index + 1
+                if isText:
+                    self._endJob(source, 'formfeed')
+                index = chunk.find(FormFeed, pos)
+        source.add(chunk[pos:])
+
+        # (Re-)start idle timer
+        if source.timer is not None:
+            source.timer.cancel()
+        source.timer = None
+        if source.size:
+            source.timer = asyncio.get_running_loop().call_later(self._idleTimeout, self._endJob, source, 'idle')
+
+    def _endJob(self, source, reason):
+        if source.timer is not None:
+            source.timer.cancel()
+            source.timer = None
+        if not source.size:
+            return
+        job = printJob(source.name, source.jobs, source.Flowable + source.device.flush(), source.size, reason)
+        source.newJob()
+        future = asyncio.get_running_loop().run_in_executor(self._executor, self._jobHandler, job)
+        future.add_done_callback(self._jobDone)
+        self._pending.append(future)
+
+    def _jobDone(self, future):
+        self._pending.remove(future)
+        if not future.cancelled() and future.exception() is not None:
+            print('Error in job handler: ' + repr(future.exception()))
+
+class inputSource(object):
+    # State of one source: its device and the data of the current job
+    def __init__(self, name, device):
+        self.name = name
+        self.device = device
+        self.jobs = 0 # Number of finished jobs
+        self.timer = None
+        self.Flowable = []
+        self.size = 0
+
+    def add(self, data):
+        if data:
+            self.Flowable += self.device.feed(data)
+            self.size += len(data)
+
+    def newJob(self):
+        self.jobs += 1
+        self.Flowable = []
+        self.size = 0
+
+class printJob(object):
+    def __init__(self, source, number, Flowable, size, reason):
+        self.source = source     # Name of the source
+        self.number = number     # Number of the job within its source, starting at 0
+        self.Flowable = Flowable # All boxes of the job
+        self.size = size         # Received bytes
+        self.reason = reason     # End of job: 'idle', 'formfeed' or 'closed'
+
+def serialRead(connection):
+    # Blocking read of all waiting bytes (at least one, until timeout of the connection)
+    return connection.read( max(1, connection.in_waiting) )
@@ -0,0 +1,150 @@
+# A part of esc2pdf (https://github.com/szihlmann/esc2pdf)
+# Copyright (C) 2021 Serge Zihlmann, Bern, Switzerland
+# MIT license -- See LICENSE.txt for details
+
+# Opt-in instrumentation of ESC_Device, PDFWriter and pdfDoc
+import json
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from .boxes import BandGraphicsBox
+
+# Number of dots (set bits) per graphic byte
+bitCounts = bytes( bin(byte).count('1') for byte in range(256) )
+
+class Metrics(object):
+    """
+        Time per stage and counts of a conversion. Pass the same instance to ESC_Device.setMetrics()
+        and PDFWriter.setMetrics(); without, nothing is measured.
+        Stages: parse (contains keywords), paginate, render (contains text and graphics) and save.
+        Counts: bytes, pages, dots, boxes per type, ESC sequences per command and unknown ESC sequences.
+        callback(event, name, value) is called for every 'time' (stage, seconds) and 'unknownEscape' (command, 1).
+    """
+    def __init__(self, callback = None):
+        self.callback = callback
+        self._lock = threading.Lock() # Stages of PDFWriter.printStream() run in threads
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.timings = {}                # stage: [seconds, calls]
+            self.counts = Counter()          # bytes, pages, dots
+            self.boxes = Counter()           # Box type name: count
+            self.escapes = Counter()         # ESC command: count
+            self.unknownEscapes = Counter()  # Unhandled ESC command: count
+
+    def addTime(self, stage, seconds):
+        with self._lock:
+            timing = self.timings.setdefault(stage, [0.0, 0])
+            timing[0] += seconds
+            timing[1] += 1
+        if self.callback is not None:
+            self.callback('time', stage, seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.addTime(stage, time.perf_counter() - start)
+
+    def wrap(self, stage, function, counter = None):
+        # function, timed as stage. counter is called with the same arguments before.
+        def timedFunction(*args):
+            if counter is not None:
+                counter(*args)
+            start = time.perf_counter()
+            try:
+                return function(*args)
+            finally:
+                self.addTime(stage, time.perf_counter() - start)
+        return timedFunction
+
+    def count(self, name, n = 1):
+        with self._lock:
+            self.counts[name] += n
+
+    def countBoxes(self, Flowable):
+        with self._lock:
+            self.boxes.update( type(box).__name__ for box in Flowable )
+
+    def countDots(self, Box):
+        # Dots of a GraphicsBox or BandGraphicsBox
+        bands = Box.Bands if type(Box) is BandGraphicsBox else [Box.graphicsData]
+        self.count('dots', sum( sum( bytes(gData).translate(bitCounts) ) for gData in bands ))
+
+    def escape(self, byte, known):
+        command = escapeName(byte)
+        with self._lock:
+            self.escapes[command] += 1
+            if not known:
+                self.unknownEscapes[command] += 1
+        if not known and self.callback is not None:
+            self.callback('unknownEscape', command, 1)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'timings': { stage: {'seconds': seconds, 'calls': calls} for stage, (seconds, calls) in self.timings.items() },
+                'counts': dict(self.counts),
+                'boxes': dict(self.boxes),
+                'escapes': dict(self.escapes),
+                'unknownEscapes': dict(self.unknownEscapes)
+                }
+
+    def merge(self, stats):
+        # Add the stats() of another Metrics, e.g. of a worker process parsing a segment (see splitter.parseParallel)
+        with self._lock:
+            for stage, timing in stats['timings'].items():
+                total = self.timings.setdefault(stage, [0.0, 0])
+                total[0] += timing['seconds']
+                total[1] += timing['calls']
+            self.counts.update(stats['counts'])
+            self.boxes.update(stats['boxes'])
+            self.escapes.update(stats['escapes'])
+            self.unknownEscapes.update(stats['unknownEscapes'])
+        if self.callback is not None:
+            for stage, timing in stats['timings'].items():
+                self.callback('time', stage, timing['seconds'])
+            for command, n in stats['unknownEscapes'].items():
+                self.callback('unknownEscape', command, n)
+
+    def toJSON(self, indent = 2):
+        return json.dumps(self.stats(), indent = indent)
+
+    def toPrometheus(self, prefix = 'esc2pdf'):
+        # Text exposition format of Prometheus
+        stats = self.stats()
+        lines = []
+        def metric(name, help, samples):
+            lines.append('# HELP {}_{} {}'.format(prefix, name, help))
+            lines.append('# TYPE {}_{} counter'.format(prefix, name))
+            for labels, value in samples:
+                lines.append('{}_{}{} {}'.format(prefix, name, labels, value))
+        metric('stage_seconds_total', 'Time spent per stage.',
+               [('{stage="%s"}' % stage, t['seconds']) for stage, t in sorted(stats['timings'].items())])
+        metric('stage_calls_total', 'Measured calls per stage.',
+               [('{stage="%s"}' % stage, t['calls']) for stage, t in sorted(stats['timings'].items())])
+        for name, value in sorted(stats['counts'].items()):
+            metric(name + '_total', 'Number of ' + name + '.', [('', value)])
+        metric('boxes_total', 'Boxes parsed per type.', [('{type="%s"}' % name, n) for name, n in sorted(stats['boxes'].items())])
+        metric('escape_sequences_total', 'ESC sequences per command.',
+               [('{command="%s"}' % name, n) for name, n in sorted(stats['escapes'].items())])
+        metric('unknown_escape_sequences_total', 'Unhandled ESC sequences per command.',
+               [('{command="%s"}' % name, n) for name, n in sorted(stats['unknownEscapes'].items())])
+        return '\n'.join(lines) + '\n'
+
+    def write(self, fileName, format = 'json'):
+        # Dump to file as 'json' or 'prometheus' text
+        with open(fileName, 'w') as f:
+            f.write( self.toPrometheus() if format == 'prometheus' else self.toJSON() )
+
+def timed(metrics, stage):
+    # Context manager timing stage if metrics is set, doing nothing otherwise
+    return nullcontext() if metrics is None else metrics.timer(stage)
+
+def escapeName(byte):
+    # Printable command character, otherwise its hex code (also for quote and backslash, usable as label value)
+    return byte.decode('ascii') if 0x21 <= byte[0] <= 0x7e and byte not in b'"\\' else '0x%02x' % byte[0]
@@ -0,0 +1,46 @@
+# A part of esc2pdf (https://github.com/szihlmann/esc2pdf)
+# Copyright (C) 2021 Serge Zihlmann, Bern, Switzerland
+# MIT license -- See LICENSE.txt for details
+
+from collections import OrderedDict
+
+class PageCache(object):
+    # LRU cache of rendered pages (renderedPage objects), limited by the size of their content in bytes
+    def __init__(self, budget = 32 * 1024 * 1024):
+        self.budget = budget   # Bytes, 0 disables the cache
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        page = self._entries.get(key)
+        if page is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._entries.move_to_end(key)
+        return page
+
+    def put(self, key, page):
+        if page is None or page.size > self.budget:
+            return
+        if key in self._entries:
+            self.size -= self._entries.pop(key).size
+        self._entries[key] = page
+        self.size += page.size
+        while self.size > self.budget: # Drop least recently used pages
+            self.size -= self._entries.popitem(last = False)[1].size
+
+    def setBudget(self, budget):
+        self.budget = budget
+        while self.size > self.budget:
+            self.size -= self._entries.popitem(last = False)[1].size
+
+    def clear(self):
+        # Drop all pages, the hit and miss counts are kept
+        self._entries.clear()
+        self.size = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'pages': len(self._entries), 'size': self.size, 'budget': self.budget}
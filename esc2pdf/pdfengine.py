@@ -2,24 +2,62 @@
 # Copyright (C) 2021 Serge Zihlmann, Bern, Switzerland
 # MIT license -- See LICENSE.txt for details
 
+import re
+import threading
+import zlib
+from hashlib import md5
 from reportlab.pdfgen.canvas import Canvas
-from reportlab.pdfbase import pdfmetrics 
+from reportlab.pdfbase import pdfmetrics, pdfdoc
+from reportlab.lib.rl_accel import fp_str
+from .boxes import TextBox, GraphicsBox, BandGraphicsBox, LineFeedBox, CarriageReturnBox
+from .metrics import timed
+from .pagecache import PageCache
 
 # Global variables
 markerSize = 0.95 # 95% Marker-Fill for graphics
 
+# Per dot row k (bit k of a graphic byte): translation table of graphic bytes to b'1' (dot) or b'0' (no dot)
+dotRowTables = [bytes([0x31 if byte & (0b1 << k) else 0x30 for byte in range(256)]) for k in range(8)]
+dotRuns = re.compile(b'1+') # Horizontally adjacent dots
+fontOperator = re.compile(r'(/F\d+) [\d.]+ Tf') # Font selection in a content stream, e.g. /F1 12 Tf
+
+# Text width per (font, size, text); cleared when full
+textWidths = {}
+textWidthsLimit = 65536
+# Per font: advance of printable ASCII characters (1/1000 of size) for fixed-pitch Type 1 fonts, None otherwise
+fixedPitchAdvance = {}
+# Prepared graphics XObjects by name, shared by all documents of the process (LRU, limited by compressed size)
+graphicsForms = PageCache(8 * 1024 * 1024)
+graphicsFormsLock = threading.Lock() # Documents may be rendered in several threads
+# Approximate size in bytes of a form XObject object (dictionary, xref entry) and of each placement (operators,
+# resource entry), compared to the compressed path of a repeated graphic to decide whether a form pays off
+formOverhead = 200
+formPlacement = 100
+
 class pdfDoc(object):
-    def __init__(self, fileName, PageDef, overlay, Font, boldFont, italicFont, bold_italicFont, docProperties, scaling=1):
+    def __init__(self, fileName, PageDef, overlay, Font, boldFont, italicFont, bold_italicFont, docProperties, scaling=1, graphicsMode='Path', firstPage=1, fontState=None, metrics=None):
         self._pdfCanvas = Canvas(fileName, pagesize=(PageDef.width, PageDef.height)) # Create PDF Object
         self._pdfCanvas.setAuthor   (docProperties.Author)
         self._pdfCanvas.setTitle    (docProperties.Title)
         self._pdfCanvas.setCreator  (docProperties.Creator)
         self._pdfCanvas.setProducer (docProperties.Producer)
         self._pdfCanvas.setSubject  (docProperties.Subject)
+        self._internals = canvasInternals(self._pdfCanvas) # Private reportlab attributes, see canvasInternals
         
         self._scaling = scaling
+        self._graphicsMode = graphicsMode # 'Path' (merged dots in one path), 'Dots' (one line per dot) or 'Image'
+        if graphicsMode == 'Image' and not self._internals.forms:
+            print('Warning: Image mode is not supported by this reportlab version. Drawing graphics as paths.')
+            self._graphicsMode = 'Path'
+        self._bitImage = None # Graphics bands not yet drawn as image ('Image' mode)
+        self._graphicsCount = {} # Occurrences per graphic name in this document ('Path' mode), see countGraphics()
+        self._graphicsCounted = False # True: _graphicsCount holds all graphics of the document, else it counts while printing
+        self._graphicsForms = {} # Form XObject per repeated graphic name, used if it pays off
+        self._recording = None # Start of recorded page content
+        self._textObject = None # Text object of the current line, drawn at its end
+        self._textEnd = None # Cursor position behind the last text of the text object
         self._Cursor = cCursor(PageDef.xStart, PageDef.yStart, PageDef.width)
-        self._PageCnt = 1
+        self._PageCnt = firstPage # Page number passed to overlay
         self._LineSpacing = 0 # Will be defined with the first LineFeedBox
         self._Font = Font
         self._standardFont = Font
@@ -29,31 +67,100 @@ class pdfDoc(object):
         self._FontSize = 0 # Will be defined with the first TextBox
         self._bold = False # Will be defined with the first TextBox
         self._italic = False # Will be defined with the first TextBox
+        if fontState is not None: # Continue with font of a previous document
+            self._FontSize, self._bold, self._italic = fontState
         self._redefineFont() # Call this after setting font or fontsize
         self.overlay = overlay # overlay function
         self._prtOverlay()
+        self._printers = { # Print function per box type. Other boxes (PageBreakBox) are not printed.
+            TextBox: self._printText,
+            LineFeedBox: self._printLineFeed,
+            CarriageReturnBox: self._printCarriageReturn,
+            GraphicsBox: self._printGraphics,
+            BandGraphicsBox: self._printBandGraphics
+            }
+        self._metrics = metrics
+        if metrics is not None: # Time printing per box type, count dots of graphics
+            self._printers = {
+                TextBox: metrics.wrap('text', self._printText),
+                LineFeedBox: metrics.wrap('text', self._printLineFeed),
+                CarriageReturnBox: metrics.wrap('text', self._printCarriageReturn),
+                GraphicsBox: metrics.wrap('graphics', self._printGraphics, metrics.countDots),
+                BandGraphicsBox: metrics.wrap('graphics', self._printBandGraphics, metrics.countDots)
+                }
 
     def printBox(self, Box):
-        if Box.isType('TextBox'):
-            BoxFontSize = Box.FontSize * self._scaling
-            if BoxFontSize != self._FontSize: # Change FontSize if necessary
-                self._FontSize = BoxFontSize
-                self._redefineFont()
-            if Box.boldFont != self._bold:
-                self._bold = Box.boldFont
-                self._redefineFont()
-            if Box.italicFont != self._italic:
-                self._italic = Box.italicFont
-                self._redefineFont()
-            self._pdfCanvas.drawString(self._Cursor.x, self._Cursor.y, Box.Text)
-            self._moveTextWidth(Box.Text) # move cursor with typed text in x
-        elif Box.isType('LineFeedBox'):
-            self._LineSpacing = Box.LineSpace * self._scaling
-            self._nextLine()
-        elif Box.isType('CarriageReturnBox'):
-            self._Cursor.CR() # Return to line start
-        elif Box.isType('GraphicsBox'):
-            self._printGraphics(Box)
+        printer = self._printers.get(type(Box))
+        if printer is not None:
+            printer(Box)
+
+    def _printText(self, Box):
+        Text = Box.Text
+        BoxFontSize = Box.FontSize * self._scaling
+        if self._bitImage is not None and not Text.isspace():
+            # Keep the painting order where text and the pending bitmap overlap. Other text, e.g. the blank
+            # indentation or axis labels of a plot, lets the bitmap continue with the next band.
+            x, y = self._Cursor.x, self._Cursor.y
+            width = textWidth(Text, self._fontOf(Box.boldFont, Box.italicFont), BoxFontSize)
+            if self._bitImage.overlaps(x, y - BoxFontSize / 4, x + width, y + BoxFontSize):
+                self._flushBitImage()
+        fontChanged = BoxFontSize != self._FontSize or Box.boldFont != self._bold or Box.italicFont != self._italic
+        if fontChanged:
+            self._FontSize = BoxFontSize
+            self._bold = Box.boldFont
+            self._italic = Box.italicFont
+        x, y = self._Cursor.x, self._Cursor.y
+        if self._textObject is None: # First text of the line opens a text object
+            self._textObject = self._pdfCanvas.beginText(x, y)
+        elif (x, y) != self._textEnd: # Cursor moved other than by text (CR, graphics)
+            self._textObject.setTextOrigin(x, y)
+        if fontChanged: # Change font only once per box, if necessary
+            self._redefineFont()
+        self._textObject.textOut(Text)
+        self._moveTextWidth(Text) # move cursor with typed text in x
+        self._textEnd = (self._Cursor.x, self._Cursor.y)
+
+    def _printLineFeed(self, Box):
+        self._flushText()
+        self._LineSpacing = Box.LineSpace * self._scaling
+        self._nextLine()
+
+    def _printCarriageReturn(self, Box):
+        self._Cursor.CR() # Return to line start
+
+    def startRecording(self):
+        # Remember where the content of the current page starts (nothing is recorded without the internals)
+        self._recording = (self._internals.mark(), self._PageCnt) if self._internals.recording else None
+
+    def stopRecording(self):
+        # Returns the content drawn since startRecording() as renderedPage, None if it spans several pages
+        self._flushText()
+        self._flushBitImage()
+        if self._recording is None:
+            return None
+        mark, pageCnt = self._recording
+        self._recording = None
+        if pageCnt != self._PageCnt:
+            return None
+        code, forms, fonts = self._internals.recorded(mark)
+        state = (self._Cursor.x, self._Cursor.y, self._LineSpacing, self._FontSize, self._bold, self._italic)
+        return renderedPage(code, forms, fonts, state + self._internals.fontState())
+
+    def replay(self, page):
+        # Draw recorded page content instead of printing its boxes. Returns False (nothing drawn) if the
+        # internal names of its fonts are taken by other fonts in this document.
+        if not self._internals.recording or not self._internals.replay(page.code, page.forms, page.fonts):
+            return False
+        self._Cursor.x, self._Cursor.y, self._LineSpacing, self._FontSize, self._bold, self._italic = page.state[:6]
+        self._internals.setFontState(page.state[6:])
+        self._Font = self._fontOf(self._bold, self._italic) # The font operators are part of the code
+        return True
+
+    def fontState(self):
+        return (self._FontSize, self._bold, self._italic)
+
+    def pageNumber(self):
+        return self._PageCnt
 
     def _nextLine(self):
         self._Cursor.move(0, self._LineSpacing)
@@ -62,6 +169,8 @@ class pdfDoc(object):
             self.nextPage()
 
     def nextPage(self):
+        self._flushText()
+        self._flushBitImage()
         self._PageCnt += 1
         self._Cursor.reset()
         self._pdfCanvas.showPage() # End page and start new one
@@ -77,10 +186,189 @@ class pdfDoc(object):
         pass # by default no overlay defined
 
     def _moveTextWidth(self, Text):
-        textWidth = pdfmetrics.stringWidth(Text, self._Font, self._FontSize)
-        self._Cursor.move(textWidth, 0)
+        self._Cursor.move(textWidth(Text, self._Font, self._FontSize), 0)
 
     def _printGraphics(self, gBox):
+        self._flushText() # Keep the painting order of text and graphics
+        if self._graphicsMode == 'Dots':
+            self._printGraphicsDots(gBox)
+        elif self._graphicsMode == 'Image':
+            self._printGraphicsImage(gBox)
+        else:
+            self._printGraphicsPath([gBox.graphicsData], gBox.H_resolution, gBox.V_resolution)
+
+    def _printBandGraphics(self, bBox):
+        self._flushText()
+        if self._graphicsMode == 'Path':
+            self._printGraphicsPath(bBox.Bands, bBox.H_resolution, bBox.V_resolution, bBox.BandSpace)
+        else: # Band per band, as if the original GraphicsBox, CR, LF (and indentation) were printed
+            x = self._Cursor.x
+            for n, gBox in enumerate( bBox.bandBoxes() ):
+                if n > 0:
+                    self._Cursor.CR()
+                    self._LineSpacing = bBox.BandSpace * self._scaling
+                    self._nextLine()
+                    self._Cursor.x = x
+                self._printGraphics(gBox)
+
+    def countGraphics(self, pages):
+        # Count the graphics of the pages to be printed ('Path' mode). A graphic occurring several times is drawn
+        # as form XObject, from its first occurrence on, if this is smaller than drawing it inline every time.
+        # Without counting (lazy pagination, printStream()), graphics are counted while printing: the first occurrence
+        # is drawn inline, later ones as form once it pays off.
+        if self._graphicsMode != 'Path':
+            return
+        self._graphicsCounted = True
+        for page in pages:
+            for Box in page.Boxes:
+                boxType = type(Box)
+                if boxType is GraphicsBox:
+                    bands, bandSpace = [Box.graphicsData], 0
+                elif boxType is BandGraphicsBox:
+                    bands, bandSpace = Box.Bands, Box.BandSpace
+                else:
+                    continue
+                name = graphicsName(bands, *self._graphicsSteps(Box.H_resolution, Box.V_resolution, bandSpace))
+                self._graphicsCount[name] = self._graphicsCount.get(name, 0) + 1
+
+    def _graphicsSteps(self, H_resolution, V_resolution, bandSpace):
+        # Distance of dot columns, dot rows and bands in pts
+        return 72.0 / H_resolution * self._scaling, 72.0 / V_resolution * self._scaling, bandSpace * self._scaling
+
+    def _printGraphicsPath(self, bands, H_resolution, V_resolution, bandSpace=0):
+        # Draw each row of dots as horizontal segments, adjacent dots merged. All segments form one path object.
+        # Bands are stacked downwards by bandSpace, each one starting at the cursor's x-position.
+        xStep, yStep, bandStep = self._graphicsSteps(H_resolution, V_resolution, bandSpace)
+        bands = [ bytes(gData) for gData in bands ]
+        form = None
+        name = graphicsName(bands, xStep, yStep, bandStep)
+        if not self._graphicsCounted:
+            self._graphicsCount[name] = self._graphicsCount.get(name, 0) + 1
+        count = self._graphicsCount.get(name, 0)
+        if count > 1 and self._internals.forms:
+            if name not in self._graphicsForms:
+                self._graphicsForms[name] = self._graphicsForm(name, bands, xStep, yStep, bandStep)
+            form = self._graphicsForms[name]
+            if form.streamContent is not None and (count - 1) * form.size <= formOverhead + count * formPlacement:
+                form = None # Smaller inline
+        if form is not None:
+            self._placeGraphicsForm(form)
+        else:
+            path, hasDots = self._graphicsPath(bands, self._Cursor.x, self._Cursor.y, xStep, yStep, bandStep)
+            if hasDots:
+                self._pdfCanvas.setLineWidth(markerSize * yStep) # Stroke thickness of lines
+                self._pdfCanvas.drawPath(path, stroke=1, fill=0)
+
+        x = self._Cursor.x
+        for j in range( len(bands[-1]) ):
+            x += xStep                          # Move like the cursor does per column
+        self._Cursor.x = x                      # Move behind last band
+        self._Cursor.checkLims()
+        if len(bands) > 1:
+            self._LineSpacing = bandStep
+            for gData in bands[1:]:
+                self._Cursor.y -= bandStep      # Like the bands were drawn
+            if self._Cursor.y < 0:
+                print('Warning: Page overflow. Extra page inserted.')
+                self.nextPage()
+
+    def _graphicsPath(self, bands, x0, y0, xStep, yStep, bandStep):
+        # Returns the path of the segments of all bands, the first band's first dot column at x0 / lowest row at y0,
+        # and whether it contains any dot
+        markerSizeX = markerSize * xStep / 2
+        xPos = [] # x-position of every column, accumulated like the cursor moves
+        x = x0
+        for j in range( max( len(gData) for gData in bands ) + 1 ):
+            xPos.append(x)
+            x += xStep
+
+        path = self._pdfCanvas.beginPath()
+        hasDots = False
+        for n, gData in enumerate(bands):
+            if n > 0:
+                y0 -= bandStep                  # Move down like a LineFeed does
+            for k in range(8):                  # For each row of pixels
+                y = y0 + k*yStep
+                for run in dotRuns.finditer( gData.translate(dotRowTables[k]) ):
+                    path.moveTo(xPos[run.start()] - markerSizeX, y)
+                    path.lineTo(xPos[run.end() - 1] + markerSizeX, y)
+                    hasDots = True
+        return path, hasDots
+
+    def _graphicsForm(self, name, bands, xStep, yStep, bandStep):
+        # Form XObject of a graphic, prepared once per process
+        with graphicsFormsLock:
+            form = graphicsForms.get(name)
+        if form is None:
+            path, hasDots = self._graphicsPath(bands, 0, 0, xStep, yStep, bandStep)
+            lineWidth = markerSize * yStep
+            bbox = (-xStep - lineWidth, -bandStep * (len(bands) - 1) - lineWidth,
+                    max( len(gData) for gData in bands ) * xStep + lineWidth, 8 * yStep + lineWidth)
+            content = None # Nothing to draw
+            if hasDots:
+                content = zlib.compress( ('%s w\n%s S' % (fp_str(lineWidth), path.getCode())).encode('latin-1') )
+            form = graphicsFormXObject(name, bbox, content)
+            with graphicsFormsLock:
+                graphicsForms.put(name, form)
+        return form
+
+    def _placeGraphicsForm(self, form):
+        # Draw the graphic as form XObject at the cursor, embedded once per PDF
+        if form.streamContent is None: # Nothing to draw
+            return
+        self._internals.addForm(form)
+        self._pdfCanvas.saveState()
+        self._pdfCanvas.translate(self._Cursor.x, self._Cursor.y)
+        self._pdfCanvas.doForm(form.name)
+        self._pdfCanvas.restoreState()
+
+    def _printGraphicsImage(self, gBox):
+        # Collect the band into a bitmap. Bands continuing the pending bitmap downwards are stacked onto it.
+        xStep = 72.0 / gBox.H_resolution * self._scaling
+        yStep = 72.0 / gBox.V_resolution * self._scaling
+        if self._bitImage is None or not self._bitImage.continuesWith(self._Cursor.x, self._Cursor.y, xStep, yStep):
+            self._flushBitImage()
+            self._bitImage = bitImage(self._Cursor.x, xStep, yStep)
+        self._bitImage.addBand(self._Cursor.y, gBox.graphicsData)
+
+        x = self._Cursor.x
+        for j in range( len(gBox.graphicsData) ):
+            x += xStep                          # Move like the cursor does per column
+        self._Cursor.x = x                      # Move behind graphics
+        self._Cursor.checkLims()
+
+    def _flushText(self):
+        # Draw the pending text object of the current line
+        if self._textObject is None:
+            return
+        self._pdfCanvas.drawText(self._textObject)
+        self._textObject = None
+
+    def _flushBitImage(self):
+        # Embed pending bitmap as image XObject (once per PDF for equal bitmaps) and place it
+        if self._bitImage is None:
+            return
+        img = self._bitImage
+        self._bitImage = None
+        if not img.hasDots():
+            return
+        width, height, rows = img.bitmap()
+        name = 'escImage' + md5(rows + width.to_bytes(4, 'big')).hexdigest()
+        if not self._pdfCanvas.hasForm(name):
+            with graphicsFormsLock:
+                form = graphicsForms.get(name) # Compressed by an earlier document
+            if form is None:
+                form = bitImageXObject(name, width, height, zlib.compress(rows))
+                with graphicsFormsLock:
+                    graphicsForms.put(name, form)
+            self._internals.addForm(form)
+        self._pdfCanvas.saveState()
+        self._pdfCanvas.translate(img.x - img.xStep / 2, img.y - img.yStep / 2) # lower left corner of the dots
+        self._pdfCanvas.scale(width * img.xStep, height * img.yStep)
+        self._pdfCanvas.doForm(name)
+        self._pdfCanvas.restoreState()
+
+    def _printGraphicsDots(self, gBox):
         gData = gBox.graphicsData
         xStep = 72.0 / gBox.H_resolution * self._scaling
         yStep = 72.0 / gBox.V_resolution * self._scaling
@@ -96,20 +384,238 @@ class pdfDoc(object):
                         self._Cursor.x + markerSizeX, self._Cursor.y + k*yStep ) 
             self._Cursor.move(xStep, 0)         # Move 1 step in x
     
+    def _fontOf(self, bold, italic):
+        if italic and bold:
+            return self._bold_italicFont
+        if italic:
+            return self._italicFont
+        if bold:
+            return self._boldFont
+        return self._standardFont
+
     def _redefineFont(self):
-        if self._italic and self._bold:
-            self._Font = self._bold_italicFont
-        elif self._italic:
-            self._Font = self._italicFont
-        elif self._bold:
-            self._Font = self._boldFont
-        else:
-            self._Font = self._standardFont
+        self._Font = self._fontOf(self._bold, self._italic)
 
-        self._pdfCanvas.setFont(self._Font, self._FontSize)
+        if self._textObject is None:
+            self._pdfCanvas.setFont(self._Font, self._FontSize)
+        elif self._internals.textFonts: # Switch font within the text of the line
+            self._internals.setTextFont(self._textObject, self._Font, self._FontSize)
+        else: # Draw the text so far, continue in a new text object
+            self._flushText()
+            self._pdfCanvas.setFont(self._Font, self._FontSize)
+            self._textObject = self._pdfCanvas.beginText(self._Cursor.x, self._Cursor.y)
 
     def save(self):
-        self._pdfCanvas.save()
+        self._flushText()
+        self._flushBitImage()
+        with timed(self._metrics, 'save'):
+            self._pdfCanvas.save()
+
+def textWidth(Text, Font, FontSize):
+    # Same result as pdfmetrics.stringWidth(). Printable ASCII in fixed-pitch Type 1 fonts (e.g. Courier) is
+    # computed from the advance as reportlab does (integer sum of widths * 0.001 * size), other text is cached.
+    if Font not in fixedPitchAdvance:
+        fixedPitchAdvance[Font] = fixedAdvance(Font)
+    advance = fixedPitchAdvance[Font]
+    if advance is not None and Text.isascii() and Text.isprintable():
+        return advance * len(Text) * 0.001 * FontSize
+    key = (Font, FontSize, Text)
+    width = textWidths.get(key)
+    if width is None:
+        if len(textWidths) >= textWidthsLimit:
+            textWidths.clear()
+        width = textWidths[key] = pdfmetrics.stringWidth(Text, Font, FontSize)
+    return width
+
+def fixedAdvance(Font):
+    # Common width of the printable ASCII characters of a Type 1 font, None if they differ or for True-Type fonts
+    font = pdfmetrics.getFont(Font)
+    if font._dynamicFont:
+        return None
+    widths = { round( font.stringWidth(chr(c), 1000) ) for c in range(32, 127) }
+    return widths.pop() if len(widths) == 1 else None
+
+def usedFonts(code, fontMapping):
+    # (font name, internal name) of the fonts selected by content stream operators, in order of internal name
+    internalNames = set( fontOperator.findall( '\n'.join(code) ) )
+    fonts = [ (font, internalName) for font, internalName in fontMapping.items() if internalName in internalNames ]
+    return sorted( fonts, key = lambda font: int(font[1][2:]) )
+
+class canvasInternals(object):
+    """
+        The private reportlab attributes used by pdfDoc, all in one place: the content stream of the page (_code),
+        the forms placed on it (_formsinuse), the font and XObject tables of the document (_doc) and the font
+        state of the canvas. Tested with the reportlab versions allowed by setup.py. If attributes are missing,
+        the features using them fall back to normal rendering: pages are not cached and replayed (recording),
+        repeated graphics are drawn inline and Image mode is replaced by Path mode (forms), a font change within
+        a line starts a new text object (textFonts).
+    """
+    def __init__(self, canvas):
+        self._canvas = canvas
+        doc = getattr(canvas, '_doc', None)
+        self.forms = hasattr(doc, 'addForm')
+        self.textFonts = hasAttributes(canvas, '_fontname', '_fontsize', '_leading')
+        self.recording = (self.forms and self.textFonts and hasAttributes(canvas, '_code', '_formsinuse')
+                          and hasAttributes(doc, 'fontMapping', 'idToObject', 'getXObjectName', 'getInternalFontName'))
+
+    def addForm(self, form):
+        # Register a copy of the XObject with the document, once per name (documents must not share objects)
+        if not self._canvas.hasForm(form.name):
+            self._canvas._doc.addForm(form.name, form.copy())
+
+    def mark(self):
+        # Current end of the content stream and of the forms in use
+        return len(self._canvas._code), len(self._canvas._formsinuse)
+
+    def recorded(self, mark):
+        # Content stream operators, (name, XObject) of the forms and (font, internal name) of the fonts since mark
+        codeStart, formStart = mark
+        doc = self._canvas._doc
+        forms = [ (name, doc.idToObject[doc.getXObjectName(name)]) for name in self._canvas._formsinuse[formStart:] ]
+        code = self._canvas._code[codeStart:]
+        return code, forms, usedFonts(code, doc.fontMapping)
+
+    def replay(self, code, forms, fonts):
+        # Append recorded content. Returns False (nothing appended) if the internal names of its fonts are
+        # taken by other fonts in this document.
+        doc = self._canvas._doc
+        nextFont = len(doc.fontMapping) + 1 # Internal names are assigned in order of first use: /F1, /F2, ...
+        for font, internalName in fonts:
+            if font in doc.fontMapping:
+                if doc.fontMapping[font] != internalName:
+                    return False
+            elif internalName == '/F%d' % nextFont:
+                nextFont += 1
+            else:
+                return False
+        for font, internalName in fonts:
+            doc.getInternalFontName(font)
+        for name, form in forms:
+            self.addForm(form)
+            self._canvas._formsinuse.append(name)
+        self._canvas._code.extend(code)
+        return True
+
+    def setTextFont(self, textObject, font, size):
+        # Switch the font within a text object. The canvas keeps the font of the content stream, the next text
+        # object continues with it.
+        if (self._canvas._fontname, self._canvas._fontsize) != (font, size):
+            textObject.setFont(font, size, size * 1.2) # Leading as reportlab's default
+            self.setFontState( (font, size, size * 1.2) )
+
+    def fontState(self):
+        # Font the canvas assumes for the next text object
+        return (self._canvas._fontname, self._canvas._fontsize, self._canvas._leading)
+
+    def setFontState(self, state):
+        self._canvas._fontname, self._canvas._fontsize, self._canvas._leading = state
+
+def hasAttributes(obj, *names):
+    return all( hasattr(obj, name) for name in names )
+
+class renderedPage(object):
+    # Content stream operators of a page plus the XObjects and fonts they use and the state of pdfDoc afterwards
+    def __init__(self, code, forms, fonts, state):
+        self.code = code
+        self.forms = forms
+        self.fonts = fonts
+        self.state = state
+        self.size = sum( len(operator) for operator in code ) + sum( len(form.streamContent) for name, form in forms )
+
+class bitImage(object):
+    # 1-bit bitmap of vertically adjacent 8-dot graphics bands
+    def __init__(self, x, xStep, yStep):
+        self.x = x          # Centre of first dot column
+        self.y = None       # Centre of lowest dot row
+        self.xStep = xStep
+        self.yStep = yStep
+        self.top = None     # Centre of highest dot row
+        self._bands = []    # Graphics data of each band, top band first
+
+    def continuesWith(self, x, y, xStep, yStep):
+        # True if a band at (x, y) lines up directly below the current bitmap
+        tolerance = 1e-6 * yStep
+        return (xStep == self.xStep and yStep == self.yStep and
+                abs(x - self.x) < tolerance and abs(self.y - 8 * yStep - y) < tolerance)
+
+    def addBand(self, y, gData):
+        self._bands.append( bytes(gData) )
+        self.y = y
+        if self.top is None:
+            self.top = y + 7 * self.yStep
+
+    def overlaps(self, x0, y0, x1, y1):
+        # True if the rectangle (x0, y0) - (x1, y1) intersects the area spanned by the dot centres of the bitmap.
+        # Text ending at the first dot column (label left of a plot) touches the dots by half a dot only.
+        width = max( len(band) for band in self._bands )
+        return x0 < self.x + (width - 1) * self.xStep and x1 > self.x and y0 < self.top and y1 > self.y
+
+    def hasDots(self):
+        return any( band.strip(b'\x00') for band in self._bands )
+
+    def bitmap(self):
+        # Returns width, height and rows packed to bytes (1 bit per pixel, MSB first, top row first)
+        width = max( len(band) for band in self._bands )
+        rowBytes = (width + 7) // 8
+        rows = []
+        for band in self._bands:
+            band = band.ljust(width, b'\x00')
+            for k in range(7, -1, -1):          # Top pin (bit 7) first
+                bits = band.translate(dotRowTables[k]).ljust(rowBytes * 8, b'0')
+                rows.append( int(bits, 2).to_bytes(rowBytes, 'big') )
+        return width, len(rows), b''.join(rows)
+
+class bitImageXObject(pdfdoc.PDFImageXObject):
+    # Flate compressed 1-bit image mask: dots are painted in the fill colour, everything else stays transparent
+    def __init__(self, name, width, height, streamContent):
+        self.name = name
+        self.width = width
+        self.height = height
+        self.streamContent = streamContent # Compressed rows
+        self.size = len(streamContent)
+
+    def copy(self):
+        return bitImageXObject(self.name, self.width, self.height, self.streamContent)
+
+    def format(self, document):
+        S = pdfdoc.PDFStream(content = self.streamContent)
+        S.dictionary["Type"] = pdfdoc.PDFName("XObject")
+        S.dictionary["Subtype"] = pdfdoc.PDFName("Image")
+        S.dictionary["Width"] = self.width
+        S.dictionary["Height"] = self.height
+        S.dictionary["ImageMask"] = 'true'
+        S.dictionary["Decode"] = pdfdoc.PDFArray([1, 0]) # Bit set = dot
+        S.dictionary["Filter"] = pdfdoc.PDFName("FlateDecode")
+        S.dictionary["Length"] = len(self.streamContent)
+        return S.format(document)
+
+class graphicsFormXObject(pdfdoc.PDFObject):
+    # Form XObject with the Flate compressed path of a graphic, drawn relative to the cursor position
+    def __init__(self, name, bbox, streamContent):
+        self.name = name
+        self.bbox = bbox
+        self.streamContent = streamContent # None if the graphic has no dots
+        self.size = len(streamContent or b'')
+
+    def copy(self):
+        return graphicsFormXObject(self.name, self.bbox, self.streamContent)
+
+    def format(self, document):
+        S = pdfdoc.PDFStream(content = self.streamContent)
+        S.dictionary["Type"] = pdfdoc.PDFName("XObject")
+        S.dictionary["Subtype"] = pdfdoc.PDFName("Form")
+        S.dictionary["BBox"] = pdfdoc.PDFArray( list(self.bbox) )
+        S.dictionary["Filter"] = pdfdoc.PDFName("FlateDecode")
+        S.dictionary["Length"] = len(self.streamContent)
+        return S.format(document)
+
+def graphicsName(bands, xStep, yStep, bandStep):
+    # XObject name of a graphic: hash of its bands and geometry
+    digest = md5( repr( (len(bands), xStep, yStep, bandStep) ).encode() )
+    for gData in bands:
+        digest.update( len(gData).to_bytes(4, 'big') )
+        digest.update(gData)
+    return 'escGraphics' + digest.hexdigest()
 
 class cCursor(object):
     def __init__(self, x0, y0, width):
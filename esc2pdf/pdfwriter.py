@@ -3,7 +3,13 @@
 # MIT license -- See LICENSE.txt for details
 
 from os import path
+from hashlib import md5
 from .pdfengine import pdfDoc, pagedef
+from .pagecache import PageCache
+from .stitching import stitchBands
+from .pipeline import stage
+from .metrics import timed
+from .boxes import PageBreakBox, LineFeedBox, CarriageReturnBox, BandGraphicsBox
 from reportlab.pdfbase import pdfmetrics, _fontdata
 from reportlab.pdfbase.ttfonts import TTFont
 
@@ -14,6 +20,9 @@ DFLT_FONT_Bold = 'Courier-Bold'
 DFLT_FONT_Italic = 'Courier-Oblique'
 DFLT_FONT_Bold_Italic = 'Courier-BoldOblique'
 
+# Boxes skipped at the top of an empty page
+emptyPageSkip = frozenset( (PageBreakBox, LineFeedBox, CarriageReturnBox) )
+
 # Define page --> Global for all instances of PDFWriter()
 PageDef = pagedef(210, 297) # A4 by default
 PageDef.LeftMargin(15) # mm
@@ -35,15 +44,92 @@ class PDFWriter(object):
         self._boldFont = DFLT_FONT_Bold
         self._italicFont = DFLT_FONT_Italic
         self._bold_italicFont = DFLT_FONT_Bold_Italic
+        self._graphicsMode = 'Path'  # Rendering of graphics: 'Path', 'Dots' or 'Image'
+        self._BandStitching = False  # Fuse stacked graphics lines to one box
+        self._pageCache = PageCache() # Rendered pages, reused if printPDF() is called again
+        self._metrics = None         # Opt-in instrumentation, see setMetrics()
+        self._lazyPagination = False # Render pages while paginating and release them, see setLazyPagination()
  
     def addFlowable(self, Flowable):
         self._Flowables.append(Flowable) # Append incoming Flowable
 
     def printPDF(self):
+        if self._lazyPagination: # Pages are rendered while the Flowables are put to pages, and released
+            self._pdfSetup()
+            self._makePDF( self._paginate( self._pendingFlowables() ) )
+            return
         self._createPages() # Put flowables to pages
         self._pdfSetup()
+        self._PDFdoc.countGraphics(self._Pages)
         self._makePDF()
 
+    def printStream(self, ESCdevice, stream, chunkSize = 65536, queueSize = 8):
+        # Pipelined conversion of a file-like object with ESC/P data: parsing, pagination and rendering
+        # run at the same time, connected by bounded queues. Pages are rendered as soon as they are full.
+        # The data of the stream is kept together like one Flowable. The stages are threads: the first pages are ready
+        # early, the total time is not shorter than with printPDF() (see benchmarks/bench_stream.py).
+        self._createPages() # Flowables added before
+        parser = stage(self._parseStage, ESCdevice, stream, chunkSize, queueSize = queueSize)
+        paginator = stage(self._paginateStage, parser, queueSize = queueSize)
+        parser.start()
+        paginator.start()
+        try:
+            self._pdfSetup()
+            self._makePDF(paginator)
+        finally:
+            paginator.cancel()
+            parser.cancel()
+
+    def countPages(self, Flowables = ()):
+        # Number of pages of the PDF, computed from the heights of the boxes only (no pages are created):
+        # pages so far, pending Flowables and the optional Flowables (an iterable, e.g. ESCdevice.process_stream(stream)
+        # of a separate device) placed like printStream() places the data of a stream.
+        # Allows to print totals (e.g. 'Page N of M') in the overlay of a lazily paginated PDF.
+        counter = pageCounter(self)
+        for Flowable in self._Flowables:
+            counter._placeFlowable(Flowable)
+        first = True
+        for Flowable in Flowables:
+            counter._placeFlowable(Flowable, keepTogether = first)
+            first = False
+        return counter.pages
+
+    def _parseStage(self, put, ESCdevice, stream, chunkSize):
+        for Flowable in ESCdevice.process_stream(stream, chunkSize):
+            put(Flowable)
+
+    def _paginateStage(self, put, Flowables):
+        for page in self._paginate(Flowables, continued = True):
+            put(page)
+
+    def _paginate(self, Flowables, continued = False):
+        # Generator putting Flowables to pages. Yields every page as soon as a following page was started,
+        # the last page at the end. continued: Flowables after the first continue it (data of one stream).
+        # With lazy pagination, yielded pages are released; only the current page is kept by the writer.
+        done = 0
+        first = True
+        for Flowable in Flowables:
+            with timed(self._metrics, 'paginate'):
+                self._placeFlowable(Flowable, keepTogether = first or not continued)
+            first = False
+            while done < len(self._Pages) - 1:
+                if self._lazyPagination:
+                    yield self._Pages.pop(0)
+                else:
+                    yield self._Pages[done]
+                    done += 1
+        yield from self._Pages[done:]
+        if self._lazyPagination: # Next Flowables start a new document
+            self._Pages = []
+            self._nextPage()
+
+    def _pendingFlowables(self):
+        # Generator of the added Flowables, each one released from the writer when taken
+        Flowables, self._Flowables = self._Flowables, []
+        Flowables.reverse()
+        while Flowables:
+            yield Flowables.pop()
+
     def overlay(self, *args):
         pass # by default no overlay defined
 
@@ -67,9 +153,41 @@ class PDFWriter(object):
         else:
             print('Font \'' + Font + '\' is not registered. Keeping current font.')
 
-    def _pdfSetup(self):
+    def setGraphicsMode(self, mode):
+        # 'Path': adjacent dots merged to segments of one path object (default)
+        # 'Dots': one line per dot
+        # 'Image': vertically adjacent bands embedded as 1-bit image
+        if mode in ('Path', 'Dots', 'Image'):
+            self._graphicsMode = mode
+        else:
+            print('Graphics mode \'' + mode + '\' is not supported. Keeping \'' + self._graphicsMode + '\'.')
+
+    def setPageCache(self, budget):
+        # Memory budget in bytes for rendered pages reused by the next printPDF(). 0 disables the cache.
+        self._pageCache.setBudget(budget)
+
+    def getPageCacheStats(self):
+        # Returns hits, misses, number of cached pages, size and budget of the page cache
+        return self._pageCache.stats()
+
+    def setBandStitching(self, choice):
+        # Fuse stacked graphics lines (GraphicsBox, CR, LF, GraphicsBox, ...) to one box before pagination
+        self._BandStitching = choice
+
+    def setLazyPagination(self, choice):
+        # True: printPDF() and printStream() put Flowables to pages while rendering and release each page when it is
+        # rendered, so only the current page stays in memory. Each call then prints the Flowables added since the last.
+        # getPageNumbers() counts pages with countPages(), without creating them.
+        self._lazyPagination = choice
+
+    def setMetrics(self, metrics):
+        # Record time of pagination, rendering and saving, pages and dots in metrics (esc2pdf.metrics.Metrics).
+        # None (default) disables it.
+        self._metrics = metrics
+
+    def _pdfSetup(self, fileName = None, firstPage = 1, fontState = None):
         self._PDFdoc = pdfDoc(
-                    fileName = self._PDFfilename,
+                    fileName = fileName or self._PDFfilename,
                     PageDef = PageDef,
                     overlay = self.overlay,
                     Font = self._Font,
@@ -77,19 +195,51 @@ class PDFWriter(object):
                     italicFont = self._italicFont,
                     bold_italicFont = self._bold_italicFont,
                     docProperties = self.docProperties,
-                    scaling = self._scaling
+                    scaling = self._scaling,
+                    graphicsMode = self._graphicsMode,
+                    firstPage = firstPage,
+                    fontState = fontState,
+                    metrics = self._metrics
                     ) # Create PDF printer object
 
-    def _makePDF(self):
+    def _makePDF(self, pages = None):
+        if pages is None:
+            pages = self._Pages
         FirstPage = True
-        for page in self._Pages:
+        for page in pages:
             if FirstPage:
                 FirstPage = False # no need to create a page in the first run
             else:
                 self._PDFdoc.nextPage()
+            self._printPage(page)
+        self._PDFdoc.save()
+
+    def _printPage(self, page):
+        with timed(self._metrics, 'render'):
+            self._renderPage(page)
+        if self._metrics is not None:
+            self._metrics.count('pages')
+
+    def _renderPage(self, page):
+        # Print boxes of page or replay the cached result of an equal page
+        if not self._pageCache.budget or self._hasDynamicFont():
             for Box in page.Boxes:
                 self._PDFdoc.printBox( Box )
-        self._PDFdoc.save()
+            return
+        key = (page.fingerprint(), self._Font, self._boldFont, self._italicFont, self._bold_italicFont,
+               self._graphicsMode, self._PDFdoc.fontState())
+        rendered = self._pageCache.get(key)
+        if rendered is not None and self._PDFdoc.replay(rendered):
+            return
+        self._PDFdoc.startRecording()
+        for Box in page.Boxes:
+            self._PDFdoc.printBox( Box )
+        self._pageCache.put(key, self._PDFdoc.stopRecording())
+
+    def _hasDynamicFont(self):
+        # True type fonts are subset per document, their pages can not be reused
+        fonts = (self._Font, self._boldFont, self._italicFont, self._bold_italicFont)
+        return any( pdfmetrics.getFont(font)._dynamicFont for font in fonts )
     
     def _nextPage(self):
          self._Pages.append( HighLevelPage(self._scaling) )
@@ -97,35 +247,44 @@ class PDFWriter(object):
 
     def _createPages(self):
 
-        for Flowable in self._Flowables:
-            # Check spacing for flowable on page - try to put it on current
-            if self._currentPage.isEmpty():
-                pass # No need to add page, as it is empty
-            elif not self._currentPage.hasSpace(Flowable): # If flowable larger than current page-space
-                self._nextPage()
-            
-            # Put boxes of flowable onto page(s)
-            for box in Flowable:
-                # Ignore pagebreaks, CR, LF if page is still empty
-                if self._currentPage.isEmpty():
-                    if box.isType('PageBreakBox'):
-                        continue # process next box
-                    if box.isType('LineFeedBox'):                 
-                        continue # process next box
-                    if box.isType('CarriageReturnBox'):
-                        continue # process next box
-
-                if box.isType('PageBreakBox'):
-                    self._nextPage() # Add page with PageBreakBox
-                else: # Send all other boxes to HighLevelPage
-                    self._currentPage.addBoxes( [box] )   
-                    if ( not self._currentPage.hasSpace( [] ) ): # page full
-                        self._nextPage()
+        with timed(self._metrics, 'paginate'):
+            for Flowable in self._Flowables:
+                self._placeFlowable(Flowable)
 
         # Clear processed flowables from memory
         self._Flowables.clear()
 
+    def _placeFlowable(self, Flowable, keepTogether = True):
+        # keepTogether: start a new page if the flowable does not fit on the current one
+        if self._BandStitching:
+            Flowable = stitchBands(Flowable, PageDef.VerticalSpace / self._scaling)
+
+        # Check spacing for flowable on page - try to put it on current
+        if self._currentPage.isEmpty() or not keepTogether:
+            pass # No need to add page, as it is empty or flowable continues the previous one
+        elif not self._currentPage.hasSpace(Flowable): # If flowable larger than current page-space
+            self._nextPage()
+        
+        # Put boxes of flowable onto page(s)
+        for box in Flowable:
+            boxType = type(box)
+            # Ignore pagebreaks, CR, LF if page is still empty
+            if boxType in emptyPageSkip and self._currentPage.isEmpty():
+                continue # process next box
+
+            if boxType is PageBreakBox:
+                self._nextPage() # Add page with PageBreakBox
+            else: # Send all other boxes to HighLevelPage
+                if boxType is BandGraphicsBox and not self._currentPage.isEmpty():
+                    if not self._currentPage.hasSpace( [box] ): # Keep fused graphics together
+                        self._nextPage()
+                self._currentPage.addBoxes( [box] )   
+                if ( not self._currentPage.hasSpace( [] ) ): # page full
+                    self._nextPage()
+
     def getPageNumbers(self):
+        if self._lazyPagination:
+            return self.countPages()
         self._createPages()
         return len( self._Pages )
 
@@ -142,15 +301,32 @@ class HighLevelPage():
     def __init__(self, scaling = 1):
         self.Boxes = [] # Empty list of Boxes
         self._scaling = scaling
+        self._height = 0 # Sum of linespaces of boxes until first PageBreakBox, updated in addBoxes
+        self._pageBreak = False # True once a PageBreakBox was added
 
     def _size(self):
-        return self._Fsize(self.Boxes)
+        return self._height * self._scaling
 
     def addBoxes(self, Flowable):
         self.Boxes += Flowable
+        for box in Flowable:
+            if not self._pageBreak:
+                if type(box) is PageBreakBox:
+                    self._pageBreak = True
+                else:
+                    self._height += boxHeight(box)
+
+    def fingerprint(self):
+        # Identifies the printed content of the page: boxes, scaling and page definition.
+        # Computed on request only, i.e. when the page cache is consulted.
+        fingerprint = md5()
+        for box in self.Boxes:
+            box.updateHash(fingerprint)
+        fingerprint.update( repr( (self._scaling, PageDef.width, PageDef.height, PageDef.xStart, PageDef.yStart) ).encode() )
+        return fingerprint.hexdigest()
     
     def isEmpty(self):
-        return self.Boxes == []
+        return not self.Boxes
 
     def hasSpace(self, Flowable):
         return self._Fsize(Flowable) + self._size() <= PageDef.VerticalSpace
@@ -159,8 +335,51 @@ class HighLevelPage():
         # Determine vertical size of Flowable UNTIL NEXT PAGEBREAK in points (pts) by summing linespaces in LineFeedBoxes
         size = 0
         for box in Flowable:
-            if box.isType('LineFeedBox'):
-                size += box.LineSpace
-            if box.isType('PageBreakBox'):
+            if type(box) is PageBreakBox:
                 break
+            size += boxHeight(box)
         return size * self._scaling
+
+class pageMeasure(HighLevelPage):
+    # HighLevelPage keeping only the filled height, not the boxes
+    def __init__(self, scaling = 1):
+        super().__init__(scaling)
+        self._empty = True
+
+    def addBoxes(self, Flowable):
+        for box in Flowable:
+            self._empty = False
+            if not self._pageBreak:
+                if type(box) is PageBreakBox:
+                    self._pageBreak = True
+                else:
+                    self._height += boxHeight(box)
+
+    def isEmpty(self):
+        return self._empty
+
+class pageCounter(object):
+    # Pagination of PDFWriter on pageMeasures, continuing the current page of writer. Counts the pages.
+    _placeFlowable = PDFWriter._placeFlowable
+
+    def __init__(self, writer):
+        self._BandStitching = writer._BandStitching
+        self._scaling = writer._scaling
+        self.pages = len(writer._Pages)
+        self._currentPage = pageMeasure(self._scaling)
+        self._currentPage._height = writer._currentPage._height
+        self._currentPage._pageBreak = writer._currentPage._pageBreak
+        self._currentPage._empty = writer._currentPage.isEmpty()
+
+    def _nextPage(self):
+        self.pages += 1
+        self._currentPage = pageMeasure(self._scaling)
+
+def boxHeight(box):
+    # Vertical space in pts used by a box
+    boxType = type(box)
+    if boxType is LineFeedBox:
+        return box.LineSpace
+    if boxType is BandGraphicsBox:
+        return box.Height
+    return 0
@@ -0,0 +1,75 @@
+# A part of esc2pdf (https://github.com/szihlmann/esc2pdf)
+# Copyright (C) 2021 Serge Zihlmann, Bern, Switzerland
+# MIT license -- See LICENSE.txt for details
+
+# Threads connected by bounded queues, used for pipelined conversion (PDFWriter.printStream)
+import queue
+import threading
+
+class stage(threading.Thread):
+    """
+        Runs function(put, *args) in a thread. Items passed to put() go to a bounded queue,
+        iterating over the stage returns them in order. An error in the thread is raised
+        in the consuming thread. cancel() stops a producer blocked on a full queue.
+        The thread always ends with a last item in the queue (endOfStage or the error, stageCancelled
+        if cancelled), so a consumer blocked on the queue is never left waiting.
+    """
+    def __init__(self, function, *args, queueSize = 8):
+        super().__init__(daemon = True)
+        self._function = function
+        self._args = args
+        self._queue = queue.Queue(queueSize)
+        self._cancelled = False
+        self._last = None # Last item, once it was taken by the consumer
+
+    def run(self):
+        try:
+            self._function(self._put, *self._args)
+            last = endOfStage
+        except BaseException as error: # Also stageCancelled, the consumer is told
+            last = stageError(error)
+        self._putLast(last)
+
+    def _put(self, item):
+        while not self._cancelled:
+            try:
+                self._queue.put(item, timeout = 0.1)
+                return
+            except queue.Full:
+                pass
+        raise stageCancelled()
+
+    def _putLast(self, item):
+        # Never blocks for good: once cancelled, unread items give way to the last one
+        while True:
+            try:
+                self._queue.put(item, timeout = 0.1)
+                return
+            except queue.Full:
+                if self._cancelled:
+                    try:
+                        self._queue.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    def __iter__(self):
+        while self._last is None:
+            item = self._queue.get()
+            if item is endOfStage or isinstance(item, stageError):
+                self._last = item
+            else:
+                yield item
+        if self._last is not endOfStage:
+            raise self._last.error
+
+    def cancel(self):
+        self._cancelled = True
+
+class stageError(object):
+    def __init__(self, error):
+        self.error = error
+
+class stageCancelled(Exception):
+    pass
+
+endOfStage = object()
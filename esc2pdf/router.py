@@ -0,0 +1,201 @@
+# A part of esc2pdf (https://github.com/szihlmann/esc2pdf)
+# Copyright (C) 2021 Serge Zihlmann, Bern, Switzerland
+# MIT license -- See LICENSE.txt for details
+
+# Route the Flowables of one input to several PDF documents
+import os
+import re
+import shutil
+import struct
+import tempfile
+from collections import OrderedDict
+from .esc_p import keywordPattern, mapFile, textRuns
+from .escf import encodeFlowable, decodeFlowable
+from .pdfwriter import PDFWriter
+from .boxes import LineFeedBox, PageBreakBox
+from reportlab.pdfbase import pdfmetrics, _fontdata
+from reportlab.pdfbase.ttfonts import TTFont
+
+spoolRecord = struct.Struct('<Q') # Length of the .escf data of one spooled Flowable
+unsafeChars = re.compile(r'[^\w\-. ]')
+
+class OutputRouter(object):
+    """
+        Splits the Flowables of one input (e.g. ESC_Device.process_stream()) into several PDF documents.
+        Rules (addRule) map keywords to a document name. With splitOnFormFeed, form feeds end a job and every
+        job goes as a whole to the document of its first line matching a rule. Otherwise the document changes
+        at every line matching a rule. Unmatched jobs and lines before the first match go to defaultDocument.
+        All documents share scaling, fonts, overlay and writerSetup(PDF, name), called for every new PDFWriter.
+        At most maxOpen documents keep their Flowables in memory, the least recently used ones are spooled to disk.
+        The PDFs are written by close(), one after the other.
+    """
+    def __init__(self, outputDir = '.', defaultDocument = 'unrouted.pdf', splitOnFormFeed = True, maxOpen = 64,
+                 scaling = 1, writerSetup = None, spoolDir = None):
+        self._outputDir = outputDir
+        self._defaultDocument = defaultDocument
+        self._splitOnFormFeed = splitOnFormFeed
+        self._maxOpen = maxOpen
+        self._scaling = scaling
+        self._writerSetup = writerSetup   # Optional function configuring each new PDFWriter
+        self._spoolDir = spoolDir         # Created on first use if None
+        self._ownSpoolDir = spoolDir is None
+        self._spoolFiles = 0
+        self._rules = []                  # (compiled keywords, document name)
+        self._fonts = {}                  # FontType: Font, see selectFont()
+        self.overlay = None               # Overlay function of all documents, see PDFWriter.overlay
+        self._documents = OrderedDict()   # name: routedDocument, in order of first use
+        self._open = OrderedDict()        # name: routedDocument with Flowables in memory, least recently used first
+        self._Boxes = []                  # Boxes of the current job or run of lines
+        self._document = None if splitOnFormFeed else defaultDocument # Target of self._Boxes, None: not decided yet
+
+    def addRule(self, keywords, document, regex = False):
+        # keywords: string or list, as for ESC_Device.setPageBreakKeywords(). document: file name, may contain
+        # {0} (matched text) and {1}, {2}, ... or {name} (groups of a regular expression), or a function(match) returning the name.
+        if isinstance(keywords, (str, re.Pattern)):
+            keywords = [keywords]
+        self._rules.append( (keywordPattern(keywords, regex), document) )
+
+    def register_TTFont(self, FontPath, Name):
+        pdfmetrics.registerFont(TTFont(Name, FontPath)) # Once for all documents
+
+    def selectFont(self, Font, FontType = 'Standard'):
+        # Font of all documents, see PDFWriter.selectFont()
+        if Font in _fontdata.standardFonts or Font in pdfmetrics._fonts:
+            self._fonts[FontType] = Font
+        else:
+            print('Font \'' + Font + '\' is not registered. Keeping current font.')
+
+    def addFlowable(self, Flowable):
+        lineStart = 0
+        for i, box in enumerate(Flowable):
+            boxType = type(box)
+            if boxType is LineFeedBox or (boxType is PageBreakBox and self._splitOnFormFeed):
+                self._addLine(Flowable[lineStart:i + 1], boxType is PageBreakBox)
+                lineStart = i + 1
+        if lineStart < len(Flowable): # Not terminated, e.g. ESC_Device.flush()
+            self._addLine(Flowable[lineStart:], False)
+
+    def documents(self):
+        # Names of the documents so far
+        return list(self._documents)
+
+    def close(self):
+        # Route the pending boxes and write all documents
+        self._deliver()
+        self._document = None if self._splitOnFormFeed else self._defaultDocument
+        try:
+            for document in self._documents.values():
+                self._printDocument(document)
+        finally:
+            self._documents.clear()
+            self._open.clear()
+            if self._ownSpoolDir and self._spoolDir is not None:
+                shutil.rmtree(self._spoolDir, ignore_errors = True)
+                self._spoolDir = None
+
+    def _addLine(self, Boxes, endOfJob):
+        if self._splitOnFormFeed:
+            if self._document is None:
+                self._document = self._match(Boxes)
+            self._Boxes += Boxes
+            if endOfJob:
+                self._deliver()
+                self._document = None
+        else:
+            target = self._match(Boxes)
+            if target is not None and target != self._document:
+                self._deliver()
+                self._document = target
+            self._Boxes += Boxes
+
+    def _match(self, Boxes):
+        # Document name of the first rule matching the text of the line, None if no rule matches
+        if self._rules == []:
+            return None
+        texts = [ ''.join(parts) for first, parts in textRuns(Boxes) ] # Searched separately, like pagebreak keywords
+        for pattern, document in self._rules:
+            for text in texts:
+                match = next( (match for match in pattern.finditer(text) if match.end() > match.start()), None )
+                if match is None:
+                    continue
+                if callable(document):
+                    return document(match)
+                groups = [ safeName(group or '') for group in match.groups() ]
+                named = { name: safeName(group or '') for name, group in match.groupdict().items() }
+                return document.format(safeName(match.group(0)), *groups, **named)
+        return None
+
+    def _deliver(self):
+        # Add the collected boxes as one Flowable to their document
+        if self._Boxes == []:
+            return
+        document = self._openDocument(self._document or self._defaultDocument)
+        document.Flowables.append(self._Boxes)
+        self._Boxes = []
+
+    def _openDocument(self, name):
+        document = self._documents.get(name)
+        if document is None:
+            document = routedDocument( name, os.path.join(self._outputDir, name) )
+            self._documents[name] = document
+        self._open[name] = document
+        self._open.move_to_end(name)
+        while len(self._open) > self._maxOpen:
+            self._spool( self._open.popitem(last = False)[1] )
+        return document
+
+    def _spool(self, document):
+        # Append the Flowables of the document to its spool file and release them
+        if self._spoolDir is None:
+            self._spoolDir = tempfile.mkdtemp(prefix = 'esc2pdf_router_')
+        if document.spoolFile is None:
+            document.spoolFile = os.path.join(self._spoolDir, '%d.spool' % self._spoolFiles)
+            self._spoolFiles += 1
+        with open(document.spoolFile, 'ab') as f:
+            for Flowable in document.Flowables:
+                data = encodeFlowable(Flowable)
+                f.write( spoolRecord.pack(len(data)) )
+                f.write(data)
+        document.Flowables = []
+
+    def _printDocument(self, document):
+        PDF = PDFWriter(document.fileName, scaling = self._scaling)
+        for FontType, Font in self._fonts.items():
+            PDF.selectFont(Font, FontType)
+        if self.overlay is not None:
+            PDF.overlay = self.overlay
+        if self._writerSetup is not None:
+            self._writerSetup(PDF, document.name)
+        for Flowable in document.spooled():
+            PDF.addFlowable(Flowable)
+        for Flowable in document.Flowables:
+            PDF.addFlowable(Flowable)
+        directory = os.path.dirname(document.fileName)
+        if directory:
+            os.makedirs(directory, exist_ok = True)
+        PDF.printPDF()
+        document.Flowables = []
+
+class routedDocument(object):
+    # Flowables routed to one output file: in memory and in the spool file (if it was evicted)
+    def __init__(self, name, fileName):
+        self.name = name
+        self.fileName = fileName
+        self.Flowables = []
+        self.spoolFile = None
+
+    def spooled(self):
+        # Generator of the spooled Flowables. Graphics data are slices of the memory mapped spool file.
+        if self.spoolFile is None:
+            return
+        view = mapFile(self.spoolFile)
+        pos = 0
+        while pos < len(view):
+            length = spoolRecord.unpack_from(view, pos)[0]
+            pos += spoolRecord.size
+            yield decodeFlowable(view[pos:pos + length])[0]
+            pos += length
+
+def safeName(text):
+    # Matched text usable within a file name (no path separators or leading dots)
+    return unsafeChars.sub('_', text).strip(' .') or '_'
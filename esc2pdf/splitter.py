@@ -0,0 +1,164 @@
+# A part of esc2pdf (https://github.com/szihlmann/esc2pdf)
+# Copyright (C) 2021 Serge Zihlmann, Bern, Switzerland
+# MIT license -- See LICENSE.txt for details
+
+# Index of safe split points of a capture and parallel parsing of the segments between them
+import copy
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from .esc_p import ESC_Device, mapFile
+from .metrics import Metrics
+from .states import IDLE
+from .boxes import TextBox
+
+escByte = re.compile(b'\x1b')
+lineFeed = re.compile(b'\x0a')
+
+class splitPoint(object):
+    # Offset just after a linefeed: the parser is IDLE, all boxes are in the Flowable.
+    # LineSpace, boldFont and italicFont are the device properties at the offset (the only ones set by ESC code).
+    __slots__ = ('offset', 'LineSpace', 'boldFont', 'italicFont')
+
+    def __init__(self, offset, LineSpace, boldFont, italicFont):
+        self.offset = offset
+        self.LineSpace = LineSpace
+        self.boldFont = boldFont
+        self.italicFont = italicFont
+
+    def apply(self, devProperties):
+        devProperties.LineSpace = self.LineSpace
+        devProperties.boldFont = self.boldFont
+        devProperties.italicFont = self.italicFont
+
+    def properties(self, devProperties):
+        # Copy of devProperties as the parser has them at this split point
+        properties = copy.copy(devProperties)
+        self.apply(properties)
+        return properties
+
+def indexSplitPoints(data, devProperties, spacing = 1 << 20):
+    """
+        Returns the split points of data, at least spacing bytes apart. data must start at a line start
+        (parser IDLE, no pending boxes) with devProperties, which are not changed.
+        Only ESC sequences are decoded: plain text is skipped by a search for the next ESC and
+        graphics payloads by their length. A split point is the first linefeed outside of ESC
+        arguments after the next multiple of spacing.
+    """
+    points = []
+    LineSpace = devProperties.LineSpace
+    boldFont = devProperties.boldFont
+    italicFont = devProperties.italicFont
+    target = spacing # Next split point at or after this offset
+    pos = 0
+    end = len(data)
+    while pos < end:
+        match = escByte.search(data, pos)
+        stop = match.start() if match else end
+
+        # Linefeeds between pos and the next ESC are plain
+        while target <= stop:
+            match_LF = lineFeed.search(data, max(pos, target - 1), stop)
+            if match_LF is None:
+                break
+            if match_LF.end() < end:
+                points.append( splitPoint(match_LF.end(), LineSpace, boldFont, italicFont) )
+            target = match_LF.end() + spacing
+        if stop + 1 >= end: # End of data, possibly within an ESC sequence
+            break
+
+        # Same commands as states.ESC
+        command = data[stop + 1]
+        pos = stop + 2
+        if command == 0x32: # ESC 2
+            LineSpace = 1/6 * 72
+        elif command == 0x33: # ESC 3 n
+            if pos >= end:
+                break
+            LineSpace = data[pos]/216 * 72
+            pos += 1
+        elif command == 0x34: # ESC 4
+            italicFont = True
+        elif command == 0x35: # ESC 5
+            italicFont = False
+        elif command == 0x45: # ESC E
+            boldFont = True
+        elif command == 0x46: # ESC F
+            boldFont = False
+        elif command == 0x4b: # ESC K nL nH d1 .... dk
+            if pos + 1 >= end:
+                break
+            k = data[pos] + data[pos + 1] * 256
+            pos += 2 + (k if k else 1) # ESC_K drops the byte after nH if k is 0
+        # Unknown commands are dropped with the ESC
+    return points
+
+def parseParallel(ESCdevice, data, workers = None, segmentSize = 1 << 20):
+    """
+        Same Flowable and final device state as ESCdevice.process_bytearray(data), the segments between
+        split points are parsed in worker processes. The last segment is parsed by ESCdevice itself.
+        Falls back to process_bytearray() if the device is not at a line start or data is too short to split.
+        The metrics of the workers are merged into the ones of ESCdevice; its parse time is then the sum over all processes.
+    """
+    return _parseSegments(ESCdevice, data, None, workers, segmentSize)
+
+def parseFileParallel(ESCdevice, fileName, workers = None, segmentSize = 1 << 20):
+    # parseParallel() of a capture file. The index is built from the memory mapped file, workers read their segment.
+    return _parseSegments(ESCdevice, mapFile(fileName), fileName, workers, segmentSize)
+
+def _parseSegments(ESCdevice, data, fileName, workers, segmentSize):
+    workers = workers or os.cpu_count() or 1
+    if (workers == 1 or len(data) < 2 * segmentSize or not isinstance(ESCdevice.state, IDLE)
+            or len(ESCdevice.Boxes) or ESCdevice.Boxes.CmdPromptOutput):
+        return ESCdevice.process_bytearray(data)
+
+    # About two segments per worker, so a slow segment does not hold up the others
+    spacing = max( segmentSize, -(-len(data) // (2 * workers)) )
+    points = indexSplitPoints(data, ESCdevice.devProperties, spacing)
+    if points == []:
+        return ESCdevice.process_bytearray(data)
+
+    jobs = []
+    start = 0
+    measured = ESCdevice._metrics is not None
+    properties = copy.copy(ESCdevice.devProperties) # Jobs are sent while ESCdevice parses the last segment
+    for point in points:
+        source = fileName if fileName is not None else bytes( data[start:point.offset] )
+        jobs.append( (source, start, point.offset, properties, measured) )
+        start = point.offset
+        properties = point.properties(ESCdevice.devProperties)
+
+    Flowable = []
+    with ProcessPoolExecutor(max_workers = min(workers, len(jobs))) as executor:
+        results = executor.map(_parseSegment, jobs)
+        last = points[-1]
+        last.apply(ESCdevice.devProperties)
+        tail = ESCdevice.process_bytearray(data[last.offset:])
+        for segment, stats in results:
+            if measured:
+                ESCdevice._metrics.merge(stats)
+            Flowable += segment
+    Flowable += tail
+    ESCdevice.Flowable = Flowable
+    return Flowable
+
+def _parseSegment(job):
+    # Worker: parse one segment with a new device. Text is decoded here, not in the parent process.
+    # Boxes without content are unpickled as the shared instances (see boxes.py).
+    # Returns the Flowable and the stats() of the segment's metrics, None if not measured.
+    source, start, stop, properties, measured = job
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            f.seek(start)
+            data = f.read(stop - start)
+    else:
+        data = source
+    ESCdevice = ESC_Device()
+    ESCdevice.devProperties = properties
+    if measured:
+        ESCdevice.setMetrics( Metrics() )
+    Flowable = ESCdevice.process_bytearray(data)
+    for box in Flowable:
+        if type(box) is TextBox:
+            box.Text
+    return Flowable, ESCdevice._metrics.stats() if measured else None
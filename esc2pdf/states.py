@@ -25,27 +25,27 @@ charCodeTbl = {
 
 def baseCharacterDecision(byte, Boxes, properties):
     if byte == b'': # remain in this state
-        return IDLE
+        return idleState
 
     elif byte == charCodeTbl['ESC']:
-        return ESC()
+        return escState
 
     elif byte == charCodeTbl['LF']:
         t_CarriageReturn(Boxes)
         t_LineFeed(Boxes, properties.LineSpace)
-        return IDLE()
+        return idleState
         
     elif byte == charCodeTbl['CR']:
         t_CarriageReturn(Boxes)
-        return CarriageReturn()
+        return crState
 
     elif byte == charCodeTbl['FF']:
         t_FormFeed(Boxes)
-        return IDLE()
+        return idleState
 
     else:
         t_ReceiveText(byte, Boxes, properties)
-        return IDLE()
+        return idleState
 
 # ================================= #
 # ESC/POS translation engine states #
@@ -61,7 +61,7 @@ class CarriageReturn(State):
     def on_byte(self, byte, Boxes, properties):
         if byte == charCodeTbl['LF']:
             t_LineFeed(Boxes, properties.LineSpace)
-            return IDLE()
+            return idleState
         else:
             # CR is not followed by LF: Process character as usual.
             return baseCharacterDecision(byte, Boxes, properties)
@@ -71,32 +71,35 @@ class ESC(State):
     def on_byte(self, byte, Boxes, properties):
         if byte == charCodeTbl['2']:
             properties.LineSpace = 1/6 * 72 # Set 1/6 inch linespace
-            return IDLE()
+            return idleState
         elif byte == charCodeTbl['3']:
-            return ESC_3()
+            return esc3State
         elif byte == charCodeTbl['4']: # Select italic font
             properties.italicFont = True
-            return IDLE()
+            return idleState
         elif byte == charCodeTbl['5']: # Cancel italic font
             properties.italicFont = False
-            return IDLE()
+            return idleState
         elif byte == charCodeTbl['E']: # Select bold font
             properties.boldFont = True
-            return IDLE()
+            return idleState
         elif byte == charCodeTbl['F']: # Cancel bold font
             properties.boldFont = False
-            return IDLE()
+            return idleState
         elif byte == charCodeTbl['K']: # ESC K state for 60-dpi graphics
             return ESC_K()
         else:
             print('Received unknown ESC-sequence: ESC + ' + byte.decode(properties.charCode, errors='replace'))
-            return IDLE()
+            return idleState
+
+# ESC commands handled by ESC.on_byte()
+escCommands = frozenset( charCodeTbl[c] for c in ('2', '3', '4', '5', 'E', 'F', 'K') )
 
 class ESC_3(State):
 
     def on_byte(self, n, Boxes, properties):
         properties.LineSpace = n[0]/216 * 72 # Set 1/6 inch linespace
-        return IDLE()
+        return idleState
 
 class ESC_K(State):
     # Select 60-dpi graphics 
@@ -116,13 +119,39 @@ class ESC_K(State):
             self._nH = byte[0]
             self._k = self._nL + self._nH * 256 # Determine number of expected graphic bytes
         elif self._k == 0: # no graphic data to receive
-            return IDLE()
+            return idleState
         else:
             self._graphicsData += byte # append current character to graphicsData
             self._receivedChars += 1 # increase count for received chars
             
             if self._receivedChars >= self._k:
                 t_create_GraphicBox(Boxes, 60, self._graphicsData) # 60 dpi resolution
-                return IDLE()
-
-        return self
\ No newline at end of file
+                return idleState
+
+        return self
+
+    def missingBytes(self):
+        # Number of graphic bytes still expected. 0 as long as nL / nH are not received.
+        if self._k is None:
+            return 0
+        return self._k - self._receivedChars
+
+    def on_payload(self, data, Boxes, properties):
+        # Receive several graphic bytes at once (at most missingBytes())
+        if self._receivedChars == 0 and len(data) == self._k: # Complete payload in one piece: keep it, no copy
+            if isinstance(data, memoryview) and not data.readonly:
+                data = bytes(data) # The caller may reuse a writable buffer
+            t_create_GraphicBox(Boxes, 60, data) # 60 dpi resolution
+            return idleState
+        self._graphicsData += data
+        self._receivedChars += len(data)
+        if self._receivedChars >= self._k:
+            t_create_GraphicBox(Boxes, 60, self._graphicsData) # 60 dpi resolution
+            return idleState
+        return self
+
+# Shared instances of the stateless states. ESC_K holds its payload and is created per sequence.
+idleState = IDLE()
+crState = CarriageReturn()
+escState = ESC()
+esc3State = ESC_3()
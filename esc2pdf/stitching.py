@@ -0,0 +1,64 @@
+# A part of esc2pdf (https://github.com/szihlmann/esc2pdf)
+# Copyright (C) 2021 Serge Zihlmann, Bern, Switzerland
+# MIT license -- See LICENSE.txt for details
+
+# Post-parse pass fusing stacked graphics lines into one box
+from .boxes import BandGraphicsBox, GraphicsBox, CarriageReturnBox, LineFeedBox, PageBreakBox, TextBox
+
+lineEnds = (CarriageReturnBox, LineFeedBox, PageBreakBox) # Boxes after which a line starts
+
+def stitchBands(Flowable, maxHeight = None):
+    """
+        Returns a new Flowable in which stacked graphics bands are fused to BandGraphicsBoxes.
+        Bands are stacked if a GraphicsBox at line start is followed by CR, a LF of exactly
+        8 dots and another GraphicsBox of equal resolution. A band may be indented by blank text
+        (e.g. a plot right of its axis labels) if every following band has the same indentation;
+        the indentation of the following bands is dropped. maxHeight (pts) limits the
+        height of a fused box, e.g. to the vertical space of a page.
+    """
+    result = []
+    i = 0
+    while i < len(Flowable):
+        box = Flowable[i]
+        prefix = _linePrefix(result) if type(box) is GraphicsBox else None
+        if prefix is not None:
+            bBox = BandGraphicsBox(box)
+            while _nextBand(Flowable, i, bBox, prefix) and (maxHeight is None or bBox.Height + bBox.BandSpace <= maxHeight):
+                i += 3 + len(prefix)
+                bBox.addBand(Flowable[i].graphicsData)
+            if len(bBox.Bands) > 1:
+                box = bBox
+        result.append(box)
+        i += 1
+    return result
+
+def _atLineStart(Boxes, end):
+    # True if Boxes[:end] ends a line. Every Flowable starts at the beginning of a line.
+    return end == 0 or type(Boxes[end - 1]) in lineEnds
+
+def _linePrefix(Boxes):
+    # Boxes between line start and a following band: () at line start, (TextBox,) for blank text at line start,
+    # None otherwise (the band can not be the first of a stack)
+    if _atLineStart(Boxes, len(Boxes)):
+        return ()
+    last = Boxes[-1]
+    if type(last) is TextBox and last.Text.isspace() and _atLineStart(Boxes, len(Boxes) - 1):
+        return (last,)
+    return None
+
+def _sameText(a, b):
+    # True if TextBox b prints like a (same width)
+    return (type(b) is TextBox and a.Text == b.Text and a.FontSize == b.FontSize and
+            a.boldFont == b.boldFont and a.italicFont == b.italicFont)
+
+def _nextBand(Flowable, i, bBox, prefix):
+    # True if Flowable[i] is followed by CR, LF (one band high), prefix and a GraphicsBox with the same resolution
+    n = len(prefix)
+    if i + 3 + n >= len(Flowable):
+        return False
+    CR, LF = Flowable[i+1:i+3]
+    gBox = Flowable[i+3+n]
+    return (type(CR) is CarriageReturnBox and type(LF) is LineFeedBox and type(gBox) is GraphicsBox and
+            abs(LF.LineSpace - bBox.BandSpace) < 1e-9 and
+            gBox.H_resolution == bBox.H_resolution and gBox.V_resolution == bBox.V_resolution and
+            all( _sameText(a, b) for a, b in zip(prefix, Flowable[i+3:i+3+n]) ))
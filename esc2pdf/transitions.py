@@ -2,7 +2,7 @@
 # Copyright (C) 2021 Serge Zihlmann, Bern, Switzerland
 # MIT license -- See LICENSE.txt for details
 
-from .boxes import TextBox, GraphicsBox, PageBreakBox, LineFeedBox, CarriageReturnBox
+from .boxes import TextBox, GraphicsBox, carriageReturnBox, pageBreakBox, lineFeedBox
 
 def t_ReceiveText(byte, Boxes, properties):
     def addTextBox():
@@ -23,16 +23,16 @@ def t_ReceiveText(byte, Boxes, properties):
     Boxes[-1].add( byte )
 
 def t_CarriageReturn(Boxes):
-    Boxes.append( CarriageReturnBox() )
+    Boxes.append( carriageReturnBox )
     
 def t_LineFeed(Boxes, space):
-    Boxes.append( LineFeedBox(space) )
+    Boxes.append( lineFeedBox(space) )
 
 def t_FormFeed(Boxes):
-    Boxes.append( PageBreakBox() )
+    Boxes.append( pageBreakBox )
 
 def t_create_GraphicBox(Boxes, res, data):
         newBox = GraphicsBox()
         newBox.H_resolution = res # dpi  
-        newBox.graphicsData = data # bytearray
+        newBox.graphicsData = data # bytearray, bytes or read-only memoryview
         Boxes.append( newBox )
\ No newline at end of file
@@ -1,10 +1,9 @@
+import os
 from esc2pdf import ESC_Device, PDFWriter
-from readbin import readbindata
 
-# Import data
+# Input file
 folder = 'sample_binaries'
 file = '04_Spectrum_1.esc'
-bdata = readbindata(folder, file) # Convert to bytearray
 
 # Create 9-Pin ESC/P code handler
 ESCdevice = ESC_Device() # Create device to interprete ESC code
@@ -13,7 +12,7 @@ ESCdevice = ESC_Device() # Create device to interprete ESC code
 PDF = PDFWriter('out.pdf', scaling=0.85)
 
 # Process ESC-code and feed to PDF handler
-Flowable = ESCdevice.process_bytearray(bdata)
+Flowable = ESCdevice.process_file(os.path.join(folder, file)) # Memory mapped, graphics data are not copied
 PDF.addFlowable(Flowable)
 
 # Print to PDF
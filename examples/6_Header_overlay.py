@@ -39,7 +39,7 @@ for index in [3,0,1,2]:
     PDF.addFlowable(Flowable)
 
 # Create PDF-overlay / header
-Header.pages = PDF.getPageNumbers()
+Header.pages = PDF.countPages() # Total from the linespaces, without putting boxes to pages
 overlay = Header()
 PDF.overlay = overlay.GeneratorFun # Pass header/overlay functio
 
@@ -19,5 +19,8 @@ setup(
     ],
     keywords='pdf esc/p ESC/P PDF',
     zip_safe=False,
-    install_requires = 'reportlab',
+    install_requires = 'reportlab>=3.6.13,<5.1', # Tested range, pdfengine.canvasInternals uses private attributes
+    entry_points = {
+        'console_scripts': ['esc2pdf = esc2pdf.cli:main'],
+    },
 )
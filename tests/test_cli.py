@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from esc2pdf import ESC_Device, FlowableCache, cli
+from esc2pdf.boxes import TextBox
+
+def texts(Flowable):
+    return [ box.Text for box in Flowable if type(box) is TextBox ]
+
+def test_last_line_without_linefeed(tmp_path):
+    # The last line is converted, also when the parse result comes from the cache
+    capture = tmp_path / 'job.esc'
+    capture.write_bytes(b'Line one\r\nLine two')
+    cache = FlowableCache(str(tmp_path / 'cache'))
+    for run in range(2):
+        assert texts( cache.parse(str(capture), ESC_Device()) ) == ['Line one', 'Line two']
+    assert cache.stats() == {'hits': 1, 'misses': 1}
+    assert cli.main([str(capture), '-j', '1']) == 0
+    assert (tmp_path / 'job.pdf').exists()
+
+def test_output_collision(tmp_path):
+    for directory in ('a', 'b'):
+        (tmp_path / directory).mkdir()
+        (tmp_path / directory / 'job.esc').write_bytes(b'Text\r\n')
+    output = tmp_path / 'out'
+    assert cli.main([str(tmp_path / 'a'), str(tmp_path / 'b'), '-o', str(output), '-j', '1']) == 2
+    assert not output.exists() or os.listdir(output) == []
+
+@pytest.mark.parametrize('jobs', ['0', '-2'])
+def test_jobs_must_be_positive(jobs):
+    with pytest.raises(SystemExit):
+        cli.parseArguments(['x.esc', '-j', jobs])
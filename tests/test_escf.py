@@ -0,0 +1,107 @@
+"""
+    Flowables stored as .escf and read back: every box type with all its attributes, including the value
+    types (int or float) of font sizes and linespaces, text in several character codes and graphics data
+    with arbitrary bytes.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from esc2pdf import ESC_Device, FlowableCache
+from esc2pdf.boxes import (Box, TextBox, GraphicsBox, BandGraphicsBox, LineFeedBox, CarriageReturnBox, PageBreakBox,
+                           carriageReturnBox, pageBreakBox, lineFeedBox, fingerprint)
+from esc2pdf.escf import encodeFlowable, decodeFlowable, writeFlowable, readFlowable, escfError
+from esc2pdf.stitching import stitchBands
+
+folder = os.path.join(os.path.dirname(__file__), '..', 'examples', 'sample_binaries')
+
+def textBox(text, code = 'ibm437', size = 12, bold = False, italic = False):
+    box = TextBox(code, size, bold, italic)
+    box.Text = text
+    return box
+
+def graphicsBox(data, H_resolution = 60, V_resolution = 72):
+    box = GraphicsBox()
+    box.graphicsData = bytearray(data)
+    box.H_resolution = H_resolution
+    box.V_resolution = V_resolution
+    return box
+
+def bandBox(bands, V_resolution = 72):
+    box = BandGraphicsBox( graphicsBox(bands[0], V_resolution = V_resolution) )
+    for band in bands[1:]:
+        box.addBand(bytearray(band))
+    return box
+
+def attributes(box):
+    # Type and slot values, graphics data as bytes. Value types are part of the comparison.
+    values = [type(box).__name__]
+    for name in type(box).__slots__:
+        if name in ('_text', '_pending'):
+            continue
+        value = getattr(box, name)
+        if name == 'Bands':
+            value = [ bytes(band) for band in value ]
+        elif name == 'graphicsData':
+            value = bytes(value)
+        values.append( (name, type(value).__name__, value) )
+    if type(box) is TextBox:
+        values.append( ('Text', box.Text) )
+    return values
+
+def allBoxes():
+    return [
+        textBox('Plain text '), textBox('Bold', size = 10.5, bold = True), textBox('Italic', italic = True),
+        textBox('Both', bold = True, italic = True), textBox('░éα ─', 'ibm437'),
+        textBox('Umlaute äöü', 'latin_1', 8), textBox(''), textBox('surrogate \udcff'),
+        carriageReturnBox, lineFeedBox(12), lineFeedBox(24/216 * 72), lineFeedBox(0),
+        graphicsBox(bytes(range(256)) + b'\x1b\x0a\x0c'), graphicsBox(b'', 120, 72), graphicsBox(b'\xff' * 9, 240, 216),
+        bandBox([b'\x01\x02', b'\x03', b'', b'\xff' * 40]), bandBox([b'\xaa' * 7, b'\x55' * 7], V_resolution = 60),
+        pageBreakBox, PageBreakBox(), CarriageReturnBox(), LineFeedBox(8.0),
+    ]
+
+def test_all_box_types():
+    Flowable = allBoxes()
+    assert { type(box) for box in Flowable } == { TextBox, GraphicsBox, BandGraphicsBox, LineFeedBox, CarriageReturnBox, PageBreakBox }
+    decoded, info = decodeFlowable( encodeFlowable(Flowable, {'note': ['any', 1]}) )
+    assert info == {'note': ['any', 1]}
+    assert list( map(attributes, decoded) ) == list( map(attributes, Flowable) )
+    assert list( map(fingerprint, decoded) ) == list( map(fingerprint, Flowable) )
+    # Boxes without content are the shared instances
+    assert decoded[8] is decoded[-2] is carriageReturnBox and decoded[-4] is decoded[-3] is pageBreakBox
+
+def test_file(tmp_path):
+    fileName = str(tmp_path / 'boxes.escf')
+    Flowable = allBoxes()
+    writeFlowable(Flowable, fileName)
+    decoded, info = readFlowable(fileName)
+    assert info is None
+    assert list( map(attributes, decoded) ) == list( map(attributes, Flowable) )
+    assert os.listdir(str(tmp_path)) == ['boxes.escf'] # No temporary file left
+
+@pytest.mark.parametrize('file', sorted(os.listdir(folder)))
+def test_samples(tmp_path, file):
+    # Parsed and stitched sample binaries
+    with open(os.path.join(folder, file), 'rb') as f:
+        data = f.read()
+    ESCdevice = ESC_Device()
+    Flowable = stitchBands(ESCdevice.process_bytearray(data) + ESCdevice.flush())
+    fileName = str(tmp_path / 'sample.escf')
+    writeFlowable(Flowable, fileName)
+    decoded, info = readFlowable(fileName)
+    assert list( map(attributes, decoded) ) == list( map(attributes, Flowable) )
+
+def test_errors():
+    class OtherBox(Box):
+        __slots__ = ()
+    with pytest.raises(escfError):
+        encodeFlowable([OtherBox()])
+    data = encodeFlowable(allBoxes())
+    with pytest.raises(escfError):
+        decodeFlowable(data[:10])
+    with pytest.raises(escfError):
+        decodeFlowable(b'PDF!' + data[4:])
+    with pytest.raises(escfError):
+        decodeFlowable(data[:len(data) // 2])
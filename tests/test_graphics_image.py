@@ -0,0 +1,49 @@
+"""
+    Image mode: the stacked bands of a plot are embedded as one image XObject, also when every band is
+    preceded by blank indentation or a label left of the plot (07_Plot_Quench).
+"""
+import contextlib
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from esc2pdf import ESC_Device, PDFWriter
+from reportlab import rl_config
+
+folder = os.path.join(os.path.dirname(__file__), '..', 'examples', 'sample_binaries')
+
+def render(file, fileName, mode):
+    with open(os.path.join(folder, file), 'rb') as f:
+        data = f.read()
+    PDF = PDFWriter(fileName, scaling = 0.85)
+    PDF.setGraphicsMode(mode)
+    PDF.setPageCache(0)
+    PDF.addFlowable( ESC_Device().process_bytearray(data) )
+    with contextlib.redirect_stdout(io.StringIO()):
+        PDF.printPDF()
+    with open(fileName, 'rb') as f:
+        return f.read()
+
+@pytest.mark.parametrize('file', ['04_Spectrum_1.esc', '06_Quenchcurve.esc', '07_Plot_Quench.esc'])
+def test_one_image_per_plot(tmp_path, file):
+    pdf = render(file, str(tmp_path / 'plot.pdf'), 'Image')
+    assert pdf.count(b'/Subtype /Image') == 1
+
+def test_text_over_bitmap_keeps_order(tmp_path, monkeypatch):
+    # Text printed onto a pending bitmap is drawn after it, as in the input
+    monkeypatch.setattr(rl_config, 'pageCompression', 0)
+    band = b'\x1bK\x08\x00' + b'\xff' * 8
+    data = b'\x1b3\x18' + band + b'\r\n' + band + b'\rXY\r\n'
+    fileName = str(tmp_path / 'overlap.pdf')
+    PDF = PDFWriter(fileName)
+    PDF.setGraphicsMode('Image')
+    PDF.addFlowable( ESC_Device().process_bytearray(data) )
+    with contextlib.redirect_stdout(io.StringIO()):
+        PDF.printPDF()
+    with open(fileName, 'rb') as f:
+        pdf = f.read()
+    assert pdf.count(b'/Subtype /Image') == 1
+    assert pdf.index(b' Do') < pdf.index(b'(XY) Tj')
@@ -0,0 +1,119 @@
+"""
+    IncrementalPDFWriter: pages appended over several printPDF() calls give a file with a valid chain of
+    cross-reference tables and trailers, the right page count and the same page content as a PDF written
+    in one go from the same Flowables.
+"""
+import contextlib
+import io
+import os
+import re
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from esc2pdf import ESC_Device, PDFWriter, IncrementalPDFWriter
+from reportlab import rl_config
+
+folder = os.path.join(os.path.dirname(__file__), '..', 'examples', 'sample_binaries')
+samples = ['01_Table1_status.esc', '02_Table2_protocol.esc', '04_Spectrum_1.esc', '09_Multi_Measurements.esc']
+
+def sampleData():
+    data = b''
+    for file in samples:
+        with open(os.path.join(folder, file), 'rb') as f:
+            data += f.read() + b'\x0c'
+    return data
+
+def parsePDF(data):
+    # Follow startxref and the /Prev chain. Returns the current objects {number: bytes}, the trailers and the xref offsets.
+    objects = {}
+    trailers = []
+    sections = []
+    xref = int( data[data.rindex(b'startxref') + 9:].split()[0] )
+    while xref is not None:
+        assert data.startswith(b'xref', xref) and xref not in sections
+        sections.append(xref)
+        end = data.index(b'trailer', xref)
+        lines = data[xref:end].split(b'\n')[1:]
+        i = 0
+        while i < len(lines) and lines[i].strip():
+            first, count = map(int, lines[i].split())
+            for num in range(first, first + count):
+                entry = lines[i + 1 + num - first]
+                if entry[17:18] == b'n' and num not in objects: # The newest section wins
+                    offset = int(entry[:10])
+                    assert data.startswith(b'%d 0 obj' % num, offset)
+                    objects[num] = data[offset:data.index(b'endobj', offset)]
+            i += 1 + count
+        trailer = data[end:data.index(b'startxref', end)]
+        trailers.append(trailer)
+        prev = re.search(rb'/Prev (\d+)', trailer)
+        xref = int( prev.group(1) ) if prev else None
+    return objects, trailers, sections
+
+def reference(obj, key):
+    return int( re.search(rb'/' + key + rb' (\d+) 0 R', obj).group(1) )
+
+def pageContents(data):
+    objects, trailers, sections = parsePDF(data)
+    size = int( re.search(rb'/Size (\d+)', trailers[0]).group(1) )
+    assert max(objects) < size
+    pages = objects[ reference(objects[ reference(trailers[0], b'Root') ], b'Pages') ]
+    kids = [ int(num) for num in re.findall(rb'(\d+) 0 R', re.search(rb'/Kids \[(.*?)\]', pages, re.S).group(1)) ]
+    assert int( re.search(rb'/Count (\d+)', pages).group(1) ) == len(kids)
+    contents = []
+    for kid in kids:
+        assert b'/Type /Page\n' in objects[kid] or b'/Type /Page ' in objects[kid]
+        stream = objects[ reference(objects[kid], b'Contents') ]
+        contents.append( stream[stream.index(b'stream') + 6:].strip() )
+    return contents, len(sections)
+
+def write(writer, Flowables, fileName, calls):
+    PDF = writer(fileName, scaling = 0.85)
+    PDF.setPageCache(0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for Flowable in Flowables:
+            PDF.addFlowable(Flowable)
+            if calls:
+                PDF.printPDF()
+        if not calls:
+            PDF.printPDF()
+    with open(fileName, 'rb') as f:
+        return f.read()
+
+@pytest.mark.parametrize('parts', [2, 5, 13])
+def test_appended_pages_match_one_shot(tmp_path, monkeypatch, parts):
+    monkeypatch.setattr(rl_config, 'pageCompression', 0) # Compare the page content as text
+    data = sampleData()
+    device = ESC_Device()
+    step = len(data) // parts + 1 # Chunk boundaries fall anywhere, also in the middle of a page
+    Flowables = [ device.process_bytearray(data[i:i + step]) for i in range(0, len(data), step) ]
+    Flowables.append( device.flush() )
+
+    incremental = write(IncrementalPDFWriter, Flowables, str(tmp_path / 'incremental.pdf'), True)
+    oneShot = write(PDFWriter, Flowables, str(tmp_path / 'oneshot.pdf'), False)
+
+    contents, sections = pageContents(incremental)
+    expected, single = pageContents(oneShot)
+    assert single == 1
+    assert sections > 1 # Pages were appended as incremental updates
+    assert len(contents) == len(expected) > 1
+    assert contents == expected
+
+def test_rewrite_is_compact(tmp_path):
+    data = sampleData()
+    fileName = str(tmp_path / 'incremental.pdf')
+    PDF = IncrementalPDFWriter(fileName, scaling = 0.85)
+    device = ESC_Device()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(0, len(data), 4096):
+            PDF.addFlowable( device.process_bytearray(data[i:i + 4096]) )
+            PDF.printPDF()
+        grown = os.path.getsize(fileName)
+        pages = len( pageContents(open(fileName, 'rb').read())[0] )
+        PDF.rewritePDF()
+    with open(fileName, 'rb') as f:
+        contents, sections = pageContents(f.read())
+    assert sections == 1 and len(contents) == pages
+    assert os.path.getsize(fileName) < grown
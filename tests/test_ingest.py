@@ -0,0 +1,136 @@
+"""
+    IngestService against local stand-ins: a TCP connection to serveTCP() and a named pipe read by readPipe().
+    Jobs must end on form feed, on idle timeout and when the source closes, with all their boxes.
+"""
+import asyncio
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from esc2pdf import IngestService
+from esc2pdf.boxes import TextBox, GraphicsBox
+
+idleTimeout = 0.2
+settle = 0.5 # Seconds to wait for data to arrive, longer than idleTimeout
+
+class jobList(object):
+    # Job handler collecting the jobs (called in the job thread of the service)
+    def __init__(self):
+        self.jobs = []
+        self._lock = threading.Lock()
+
+    def __call__(self, job):
+        with self._lock:
+            self.jobs.append(job)
+
+    def summary(self):
+        # (number, reason, texts) of every job, in order of their number
+        return [ (job.number, job.reason, texts(job.Flowable)) for job in sorted(self.jobs, key = lambda job: job.number) ]
+
+def texts(Flowable):
+    return [ box.Text for box in Flowable if type(box) is TextBox ]
+
+def test_tcp():
+    handler = jobList()
+
+    async def main():
+        service = IngestService(handler, idleTimeout = idleTimeout)
+        server = await service.serveTCP('127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b'job one\r\n\x0cjob two\r\n')
+        await writer.drain()
+        await asyncio.sleep(settle)          # job one ended by the form feed, job two by the idle timeout
+        writer.write(b'job three\r\nlast line')
+        await writer.drain()
+        writer.close()
+        await writer.wait_closed()
+        await asyncio.sleep(0.1)             # job three ended by closing the connection
+        await service.close()
+
+    asyncio.run(main())
+    assert handler.summary() == [
+        (0, 'formfeed', ['job one']),
+        (1, 'idle', ['job two']),
+        (2, 'closed', ['job three', 'last line'])
+        ]
+
+def test_tcp_connections_are_separate_sources():
+    handler = jobList()
+
+    async def main():
+        service = IngestService(handler, idleTimeout = idleTimeout)
+        server = await service.serveTCP('127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        writers = []
+        for n in range(3):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writers.append(writer)
+        for n, writer in enumerate(writers): # Interleaved data of the connections
+            writer.write(b'part one of %d ' % n)
+        for n, writer in enumerate(writers):
+            writer.write(b'part two of %d\r\n\x0c' % n)
+            await writer.drain()
+        await asyncio.sleep(0.1)
+        for writer in writers:
+            writer.close()
+        await service.close()
+
+    asyncio.run(main())
+    assert sorted( (job.reason, ''.join(texts(job.Flowable))) for job in handler.jobs ) == [
+        ('formfeed', 'part one of %d part two of %d' % (n, n)) for n in range(3) ]
+
+def test_form_feed_in_graphics_data():
+    # A form feed byte within ESC K data is graphics, not the end of the job
+    handler = jobList()
+
+    async def main():
+        service = IngestService(handler, idleTimeout = idleTimeout)
+        server = await service.serveTCP('127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b'graphics\r\n\x1bK\x02\x00\x0c\x0c\r\nend\r\n\x0c')
+        await writer.drain()
+        await asyncio.sleep(0.1)
+        writer.close()
+        await service.close()
+
+    asyncio.run(main())
+    assert len(handler.jobs) == 1
+    job = handler.jobs[0]
+    assert (job.reason, texts(job.Flowable)) == ('formfeed', ['graphics', 'end'])
+    assert [ bytes(box.graphicsData) for box in job.Flowable if type(box) is GraphicsBox ] == [b'\x0c\x0c']
+
+@pytest.mark.skipif(not hasattr(os, 'mkfifo'), reason = 'named pipes need POSIX')
+def test_fifo(tmp_path):
+    handler = jobList()
+    fifo = str(tmp_path / 'printer')
+    os.mkfifo(fifo)
+
+    def write(data):
+        # Like a printing process: open, write, close. The service keeps the pipe open in between.
+        pipe = os.open(fifo, os.O_WRONLY)
+        os.write(pipe, data)
+        os.close(pipe)
+
+    async def main():
+        service = IngestService(handler, idleTimeout = idleTimeout)
+        service.addSource( service.readPipe(fifo) )
+        await asyncio.sleep(0.1)
+        write(b'fifo one\r\n\x0c')
+        await asyncio.sleep(0.1)
+        write(b'fifo two\r\n')
+        await asyncio.sleep(settle)
+        write(b'fifo three')
+        await asyncio.sleep(0.05)
+        await service.close()                # Ends the pending job of the source
+
+    asyncio.run(main())
+    assert handler.summary() == [
+        (0, 'formfeed', ['fifo one']),
+        (1, 'idle', ['fifo two']),
+        (2, 'closed', ['fifo three'])
+        ]
@@ -0,0 +1,74 @@
+"""
+    Private reportlab attributes are only used through pdfengine.canvasInternals. Without them, pages are
+    rendered instead of replayed from the page cache, graphics are drawn without XObjects and a font change
+    within a line starts a new text object.
+"""
+import contextlib
+import io
+import os
+import re
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from esc2pdf import ESC_Device, PDFWriter
+from esc2pdf import pdfengine
+from reportlab import rl_config
+from reportlab.pdfbase import pdfdoc
+
+folder = os.path.join(os.path.dirname(__file__), '..', 'examples', 'sample_binaries')
+
+@pytest.fixture(autouse = True)
+def invariant(monkeypatch):
+    monkeypatch.setattr(rl_config, 'invariant', 1)
+    monkeypatch.setattr(rl_config, 'pageCompression', 0)
+
+textOperators = re.compile(rb'(/F\d+ [\d.]+ Tf|\(.*?\) Tj)') # Font selections and shown text
+
+def samples():
+    data = b''
+    for file in ['01_Table1_status.esc', '04_Spectrum_1.esc', '07_Plot_Quench.esc']:
+        with open(os.path.join(folder, file), 'rb') as f:
+            data += f.read() + b'\x0c'
+    return data * 2
+
+def render(fileName, mode = 'Path', budget = 32 * 1024 * 1024, data = None):
+    PDF = PDFWriter(fileName, scaling = 0.85)
+    PDF.setGraphicsMode(mode)
+    PDF.setPageCache(budget)
+    PDF.addFlowable( ESC_Device().process_bytearray(data or samples()) )
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        PDF.printPDF()
+    with open(fileName, 'rb') as f:
+        return f.read(), PDF.getPageCacheStats(), output.getvalue()
+
+def test_available(tmp_path):
+    pdf, stats, output = render(str(tmp_path / 'out.pdf'), 'Image')
+    assert stats['hits'] > 0 and b'/Subtype /Image' in pdf
+
+def test_without_recording(tmp_path, monkeypatch):
+    expected = render(str(tmp_path / 'rendered.pdf'), budget = 0)[0]
+    monkeypatch.setattr(pdfengine, 'hasAttributes', lambda obj, *names: '_code' not in names)
+    pdf, stats, output = render(str(tmp_path / 'out.pdf'))
+    assert stats['hits'] == 0 and stats['pages'] == 0
+    assert pdf == expected
+
+def test_without_text_fonts(tmp_path, monkeypatch):
+    # Font changes within a line start a new text object, the text is the same
+    data = b'Plain \x1bEbold\x1bF plain \x1b4italic\x1b5\r\n' * 3
+    expected = render(str(tmp_path / 'rendered.pdf'), budget = 0, data = data)[0]
+    monkeypatch.setattr(pdfengine, 'hasAttributes', lambda obj, *names: False)
+    pdf, stats, output = render(str(tmp_path / 'out.pdf'), data = data)
+    assert stats['pages'] == 0
+    assert textOperators.findall(pdf) == textOperators.findall(expected)
+    assert pdf.count(b'BT ') > expected.count(b'BT ')
+
+@pytest.mark.parametrize('mode', ['Path', 'Image'])
+def test_without_forms(tmp_path, monkeypatch, mode):
+    monkeypatch.delattr(pdfdoc.PDFDocument, 'addForm')
+    pdf, stats, output = render(str(tmp_path / 'out.pdf'), mode)
+    assert b'/Subtype /Form' not in pdf and b'/Subtype /Image' not in pdf
+    assert re.search(rb' l\s+S', pdf) # Graphics drawn as paths
+    assert ('Image mode is not supported' in output) == (mode == 'Image')
@@ -0,0 +1,44 @@
+"""
+    Pagebreak keywords given as regular expressions: inline global flags like (?i) are allowed in each
+    expression, and an invalid expression is reported by setPageBreakKeywords with the keyword in the message.
+"""
+import os
+import re
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from esc2pdf import ESC_Device
+from esc2pdf.esc_p import keywordPattern
+
+data = b'Header\r\nPROTOCOL 1\r\nline\r\nprotocol 2\r\nline\r\nEnd of run\r\n'
+
+def pageBreaks(keywords, regex):
+    device = ESC_Device()
+    device.setPageBreakKeywords(keywords, regex)
+    Flowable = device.process_bytearray(data) + device.flush()
+    return sum( 1 for Box in Flowable if Box.Type() == 'PageBreakBox' )
+
+def test_inline_global_flags():
+    assert pageBreaks(['(?i)protocol'], True) == 2
+    assert pageBreaks(['protocol'], True) == 1
+    assert pageBreaks(['(?i)(?x) protocol \\s 2', '(?i)^end'], True) == 2
+
+def test_mixed_keywords():
+    # Literals, compiled patterns and expressions with flags in one alternation
+    assert pageBreaks(['Header', re.compile('end', re.IGNORECASE)], False) == 2
+    assert pageBreaks(['(?i)protocol', re.compile('(?i)end')], True) == 3
+    pattern = keywordPattern(['(?s)a.b', '(?a)\\w+$'], True)
+    assert pattern.search('a\nb') and pattern.fullmatch('abc')
+
+def test_invalid_expression():
+    device = ESC_Device()
+    device.setPageBreakKeywords(['Header'])
+    with pytest.raises(ValueError, match = r"'\(unclosed'"):
+        device.setPageBreakKeywords(['protocol', '(unclosed'], True)
+    with pytest.raises(ValueError, match = 'global flags'):
+        device.setPageBreakKeywords(['proto(?i)col'], True)
+    # The previous keywords stay in effect
+    assert device.devProperties.PageBreakKeywords == ['Header']
+    assert sum( 1 for Box in device.process_bytearray(data) if Box.Type() == 'PageBreakBox' ) == 1
@@ -0,0 +1,87 @@
+"""
+    Page cache: a page replayed from the cache must give the same PDF as the page rendered from its boxes,
+    for repeated pages within one document and for a second printPDF() of the same writer.
+"""
+import contextlib
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from esc2pdf import ESC_Device, PDFWriter
+from reportlab import rl_config
+
+folder = os.path.join(os.path.dirname(__file__), '..', 'examples', 'sample_binaries')
+
+@pytest.fixture(autouse = True)
+def invariant(monkeypatch):
+    # Same bytes for the same content: no timestamps, fixed document ID
+    monkeypatch.setattr(rl_config, 'invariant', 1)
+
+def sampleData(files):
+    data = b''
+    for file in files:
+        with open(os.path.join(folder, file), 'rb') as f:
+            data += f.read() + b'\x0c'
+    return data
+
+def writer(fileName, data, budget, mode):
+    PDF = PDFWriter(fileName, scaling = 0.85)
+    PDF.setPageCache(budget)
+    PDF.setGraphicsMode(mode)
+    ESCdevice = ESC_Device()
+    PDF.addFlowable( ESCdevice.process_bytearray(data) + ESCdevice.flush() )
+    return PDF
+
+def printed(PDF, fileName):
+    with contextlib.redirect_stdout(io.StringIO()):
+        PDF.printPDF()
+    with open(fileName, 'rb') as f:
+        return f.read()
+
+@pytest.mark.parametrize('mode', ['Path', 'Image', 'Dots'])
+def test_repeated_pages(tmp_path, mode):
+    # Every sample twice: the second copy of each page is replayed
+    data = sampleData(['01_Table1_status.esc', '04_Spectrum_1.esc', '05_Table4_DPM.esc']) * 2
+    fileName = str(tmp_path / 'cached.pdf')
+    PDF = writer(fileName, data, 32 * 1024 * 1024, mode)
+    cached = printed(PDF, fileName)
+    stats = PDF.getPageCacheStats()
+    assert stats['hits'] >= 2 and stats['pages'] == stats['misses']
+    fileName = str(tmp_path / 'rendered.pdf')
+    assert cached == printed( writer(fileName, data, 0, mode), fileName )
+
+def test_second_print(tmp_path):
+    # printPDF() again after adding pages: all earlier pages are replayed
+    data = sampleData(['02_Table2_protocol.esc', '07_Plot_Quench.esc', '03_Table3_CPM.esc'])
+    more = sampleData(['09_Multi_Measurements.esc'])
+    fileName = str(tmp_path / 'cached.pdf')
+    PDF = writer(fileName, data, 32 * 1024 * 1024, 'Path')
+    printed(PDF, fileName)
+    pages = PDF.getPageCacheStats()['misses']
+    PDF.addFlowable( ESC_Device().process_bytearray(more) )
+    cached = printed(PDF, fileName)
+    assert PDF.getPageCacheStats()['hits'] >= pages - 1 # The last page may continue
+
+    fileName = str(tmp_path / 'rendered.pdf')
+    PDF = writer(fileName, data, 0, 'Path')
+    PDF.addFlowable( ESC_Device().process_bytearray(more) )
+    assert cached == printed(PDF, fileName)
+
+def test_font_conflict_renders(tmp_path):
+    # Writers sharing one cache: a page whose internal font names are taken by other fonts in the second
+    # document is rendered again, the empty last page is replayed
+    page = b'\x1bE' + b'Bold\r\n' + b'\x1bF' + b'Plain\r\n\x0c'
+    other = b'\x1b4' + b'Italic first\r\n\x1b5\x0c'
+    fileName = str(tmp_path / 'first.pdf')
+    first = writer(fileName, page, 32 * 1024 * 1024, 'Path')
+    printed(first, fileName)
+    fileName = str(tmp_path / 'cached.pdf')
+    PDF = writer(fileName, other + page, 32 * 1024 * 1024, 'Path')
+    PDF._pageCache = first._pageCache
+    cached = printed(PDF, fileName)
+    assert PDF.getPageCacheStats()['hits'] == 1
+    fileName = str(tmp_path / 'rendered.pdf')
+    assert cached == printed( writer(fileName, other + page, 0, 'Path'), fileName )
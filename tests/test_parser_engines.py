@@ -0,0 +1,64 @@
+"""
+    The Bulk engine (default) must produce the same boxes as the Reference engine (byte per byte state machine)
+    on every sample binary: for the whole data at once and for the data fed in chunks, whose boundaries fall
+    into text, ESC arguments and graphics data.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from esc2pdf import ESC_Device
+from esc2pdf.boxes import fingerprint
+
+folder = os.path.join(os.path.dirname(__file__), '..', 'examples', 'sample_binaries')
+samples = sorted(os.listdir(folder))
+chunkSizes = [1, 7, 97, 4096]
+keywords = ['CPM', 'Protocol']
+
+def readSample(file):
+    with open(os.path.join(folder, file), 'rb') as f:
+        return f.read()
+
+def device(engine, pageBreakKeywords):
+    ESCdevice = ESC_Device()
+    ESCdevice.setParserEngine(engine)
+    if pageBreakKeywords:
+        ESCdevice.setPageBreakKeywords(keywords)
+    return ESCdevice
+
+def parseWhole(engine, data, pageBreakKeywords = False):
+    ESCdevice = device(engine, pageBreakKeywords)
+    return list( map(fingerprint, ESCdevice.process_bytearray(data) + ESCdevice.flush()) )
+
+def parseChunks(engine, data, chunkSize, pageBreakKeywords = False):
+    ESCdevice = device(engine, pageBreakKeywords)
+    Flowable = []
+    for start in range(0, len(data), chunkSize):
+        Flowable += ESCdevice.feed(data[start:start + chunkSize])
+    Flowable += ESCdevice.flush()
+    return list( map(fingerprint, Flowable) )
+
+@pytest.fixture(scope = 'module')
+def reference():
+    # Boxes of the Reference engine per (sample, pageBreakKeywords)
+    return { (file, pageBreakKeywords): parseWhole('Reference', readSample(file), pageBreakKeywords)
+             for file in samples for pageBreakKeywords in (False, True) }
+
+@pytest.mark.parametrize('pageBreakKeywords', [False, True])
+@pytest.mark.parametrize('file', samples)
+def test_whole(reference, file, pageBreakKeywords):
+    assert parseWhole('Bulk', readSample(file), pageBreakKeywords) == reference[file, pageBreakKeywords]
+
+@pytest.mark.parametrize('chunkSize', chunkSizes)
+@pytest.mark.parametrize('file', samples)
+def test_chunks(reference, file, chunkSize):
+    data = readSample(file)
+    assert parseChunks('Bulk', data, chunkSize) == reference[file, False]
+
+@pytest.mark.parametrize('file', samples)
+def test_reference_chunks(reference, file):
+    # The engines agree on chunked input, too
+    data = readSample(file)
+    assert parseChunks('Reference', data, 97, True) == reference[file, True]
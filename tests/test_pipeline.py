@@ -0,0 +1,122 @@
+"""
+    Pipeline stages end with a last item in their queue: errors reach the consumer, also through a chain
+    of stages, and cancelled stages end their thread even if the queue is full or the consumer waits on it.
+"""
+import contextlib
+import io
+import itertools
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from esc2pdf import ESC_Device, PDFWriter
+from esc2pdf.pipeline import stage, stageCancelled
+
+timeout = 5 # Seconds a stage may take to end
+
+def produce(put, items, error = None):
+    for item in items:
+        put(item)
+    if error is not None:
+        raise error
+
+def forward(put, source):
+    for item in source:
+        put(item * 2)
+
+def test_items_in_order():
+    numbers = stage(produce, range(100), queueSize = 2)
+    doubled = stage(forward, numbers, queueSize = 2)
+    numbers.start()
+    doubled.start()
+    assert list(doubled) == [ n * 2 for n in range(100) ]
+    assert list(doubled) == [] # The end is kept
+
+def test_error_reaches_consumer():
+    numbers = stage(produce, range(5), OSError('read failed'))
+    doubled = stage(forward, numbers)
+    numbers.start()
+    doubled.start()
+    received = []
+    with pytest.raises(OSError, match = 'read failed'):
+        for item in doubled:
+            received.append(item)
+    assert received == [0, 2, 4, 6, 8]
+    doubled.join(timeout)
+    assert not doubled.is_alive() and not numbers.is_alive()
+
+def test_cancel_full_queue():
+    # Nobody reads: the producer blocks on the full queue until it is cancelled
+    endless = stage(produce, itertools.count(), queueSize = 2)
+    endless.start()
+    endless.cancel()
+    endless.join(timeout)
+    assert not endless.is_alive()
+    with pytest.raises(stageCancelled):
+        list(endless)
+
+def test_cancel_waiting_consumer():
+    # The second stage waits on the queue of the first one, which is stalled and then cancelled
+    release = threading.Event()
+    def stalled(put):
+        put(1)
+        release.wait(timeout)
+        put(2) # Raises stageCancelled
+    first = stage(stalled)
+    second = stage(forward, first)
+    first.start()
+    second.start()
+    assert next(iter(second)) == 2
+    second.cancel()
+    first.cancel()
+    release.set()
+    first.join(timeout)
+    second.join(timeout)
+    assert not first.is_alive() and not second.is_alive()
+
+class failingStream(object):
+    # File-like object failing after some data
+    def __init__(self, data, error):
+        self._data = io.BytesIO(data)
+        self._error = error
+
+    def read(self, size = -1):
+        data = self._data.read(size)
+        if not data:
+            raise self._error
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+def pipelineThreads():
+    return [ thread for thread in threading.enumerate() if isinstance(thread, stage) ]
+
+def test_print_stream_read_error(tmp_path):
+    data = b'Line of text\r\n' * 2000
+    PDF = PDFWriter(str(tmp_path / 'out.pdf'))
+    with pytest.raises(OSError, match = 'device gone'):
+        PDF.printStream(ESC_Device(), failingStream(data, OSError('device gone')), chunkSize = 1024)
+    for thread in pipelineThreads():
+        thread.join(timeout)
+    assert pipelineThreads() == []
+
+def test_print_stream_render_error(tmp_path):
+    # The consumer (rendering) fails while the parser is still producing
+    def overlay(canvas, page):
+        if page == 3:
+            raise ValueError('overlay failed')
+    data = b'Line of text\r\n' * 20000
+    PDF = PDFWriter(str(tmp_path / 'out.pdf'))
+    PDF.overlay = overlay
+    with pytest.raises(ValueError, match = 'overlay failed'):
+        with contextlib.redirect_stdout(io.StringIO()):
+            PDF.printStream(ESC_Device(), io.BytesIO(data), chunkSize = 256, queueSize = 1)
+    for thread in pipelineThreads():
+        thread.join(timeout)
+    assert pipelineThreads() == []
@@ -0,0 +1,79 @@
+"""
+    OutputRouter with maxOpen=1: every change of document spools the previous one to disk, and documents are
+    reopened by later jobs. Each PDF must equal one written directly from the jobs routed to it, in input order.
+"""
+import contextlib
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from esc2pdf import ESC_Device, PDFWriter, OutputRouter
+from reportlab import rl_config
+
+band = b'\x1bK\x10\x00' + bytes(range(0x0a, 0x1a)) # Graphics data with a linefeed and an ESC byte
+
+def job(protocol, number):
+    lines = b'Protocol #: %d\r\n' % protocol if protocol else b'No protocol\r\n'
+    lines += b''.join( b'Job %d line %d\r\n' % (number, line) for line in range(number % 4 + 1) )
+    return lines + band + b'\r\n' + b'\x0c'
+
+protocols = [1, 2, 1, 3, 0, 1, 2, 2, 3, 1, 0] # 0: no rule matches
+
+@pytest.fixture
+def invariant(monkeypatch):
+    # Same bytes for the same content: no timestamps, fixed document ID
+    monkeypatch.setattr(rl_config, 'invariant', 1)
+
+def expected(tmp_path, jobs):
+    # PDF written directly from the jobs. A form feed is only passed on with the next boxes, the one of the last job by flush().
+    fileName = str(tmp_path / 'expected.pdf')
+    PDF = PDFWriter(fileName, scaling = 0.85)
+    ESCdevice = ESC_Device()
+    PDF.addFlowable( ESCdevice.process_bytearray( b''.join(jobs) ) + ESCdevice.flush() )
+    PDF.printPDF()
+    with open(fileName, 'rb') as f:
+        return f.read()
+
+def test_spool_and_reopen(tmp_path, invariant):
+    outputDir = tmp_path / 'out'
+    spooled = []
+    router = OutputRouter(str(outputDir), defaultDocument = 'unrouted.pdf', maxOpen = 1, scaling = 0.85)
+    router.addRule(r'Protocol #:\s*(\d+)', 'protocol_{1}.pdf', regex = True)
+    ESCdevice = ESC_Device()
+    for number, protocol in enumerate(protocols):
+        router.addFlowable( ESCdevice.process_bytearray( job(protocol, number) ) )
+        spooled.append( sum( 1 for document in router._documents.values() if document.spoolFile is not None ) )
+    router.addFlowable( ESCdevice.flush() )
+    spoolDir = router._spoolDir
+    assert spooled[-1] == 4 # All documents were evicted at least once
+    assert len(router._open) == 1
+    assert router.documents() == ['protocol_1.pdf', 'protocol_2.pdf', 'protocol_3.pdf', 'unrouted.pdf']
+    with contextlib.redirect_stdout(io.StringIO()):
+        router.close()
+    assert not os.path.exists(spoolDir)
+
+    for name, protocol in [('protocol_1.pdf', 1), ('protocol_2.pdf', 2), ('protocol_3.pdf', 3), ('unrouted.pdf', 0)]:
+        jobs = [ job(p, number) for number, p in enumerate(protocols) if p == protocol ]
+        with open(str(outputDir / name), 'rb') as f:
+            assert f.read() == expected(tmp_path, jobs), name
+
+def test_spool_in_memory_order(tmp_path, invariant):
+    # One document: spooled jobs come before the ones still in memory
+    router = OutputRouter(str(tmp_path), maxOpen = 1, scaling = 0.85)
+    router.addRule('Protocol', 'all.pdf')
+    router.addRule('No protocol', 'other.pdf')
+    jobs = [ job(1, number) for number in range(6) ]
+    ESCdevice = ESC_Device()
+    for number, data in enumerate(jobs):
+        router.addFlowable( ESCdevice.process_bytearray(data) )
+        if number % 2:
+            router.addFlowable( ESCdevice.process_bytearray( job(0, number) ) ) # Evicts all.pdf
+    router.addFlowable( ESCdevice.process_bytearray( job(1, 6) ) + ESCdevice.flush() )
+    jobs.append( job(1, 6) )
+    with contextlib.redirect_stdout(io.StringIO()):
+        router.close()
+    with open(str(tmp_path / 'all.pdf'), 'rb') as f:
+        assert f.read() == expected(tmp_path, jobs)
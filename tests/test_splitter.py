@@ -0,0 +1,81 @@
+"""
+    parseParallel() must give the same Flowable and final device state as parsing serially, with small
+    segments whose boundaries fall next to ESC 3, ESC E/F, ESC 4/5 and ESC K sequences. Their arguments
+    and graphics payloads contain linefeed bytes, which are no split points.
+"""
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from esc2pdf import ESC_Device
+from esc2pdf.boxes import fingerprint
+from esc2pdf.splitter import parseParallel, parseFileParallel, indexSplitPoints
+
+folder = os.path.join(os.path.dirname(__file__), '..', 'examples', 'sample_binaries')
+LF = 0x0a
+
+def escData(lines = 400, seed = 1):
+    # Lines of text mixed with state changing ESC sequences. Payloads and ESC 3 arguments are often a linefeed.
+    rand = random.Random(seed)
+    data = bytearray()
+    for line in range(lines):
+        for part in range(rand.randint(1, 4)):
+            choice = rand.randrange(6)
+            if choice == 0:
+                data += b'\x1b3' + bytes([ rand.choice([LF, 24, 30]) ])
+            elif choice == 1:
+                data += rand.choice([b'\x1bE', b'\x1bF'])
+            elif choice == 2:
+                data += rand.choice([b'\x1b4', b'\x1b5'])
+            elif choice == 3:
+                k = rand.choice([0, 1, 7, 60])
+                data += b'\x1bK' + bytes([k, 0]) + bytes( rand.choice([LF, 0x1b, 0xff]) for i in range(k or 1) )
+            elif choice == 4:
+                data += b'\x1b2'
+            else:
+                data += b'Line %d ' % line + b'x' * rand.randrange(20)
+        data += rand.choice([b'\r\n', b'\n', b'\r\n\x0c'])
+    return bytes(data)
+
+def state(ESCdevice):
+    properties = vars(ESCdevice.devProperties).copy()
+    return properties, type(ESCdevice.state).__name__, len(ESCdevice.Boxes)
+
+def serial(data):
+    ESCdevice = ESC_Device()
+    Flowable = ESCdevice.process_bytearray(data)
+    return list( map(fingerprint, Flowable) ), state(ESCdevice)
+
+@pytest.mark.parametrize('segmentSize', [64, 128])
+@pytest.mark.parametrize('seed', [1, 2])
+def test_segments_like_serial(seed, segmentSize):
+    data = escData(lines = 120, seed = seed)
+    workers = 24 # The segments are at least len(data) / (2 * workers) long
+    assert len(data) // (2 * workers) <= segmentSize
+    assert len( indexSplitPoints(data, ESC_Device().devProperties, segmentSize) ) > 10
+    ESCdevice = ESC_Device()
+    Flowable = parseParallel(ESCdevice, data, workers = workers, segmentSize = segmentSize)
+    assert ( list( map(fingerprint, Flowable) ), state(ESCdevice) ) == serial(data)
+    assert ESCdevice.Flowable == Flowable
+
+def test_split_points_are_line_starts():
+    # Parsing up to every split point leaves the parser IDLE with the indexed properties
+    data = escData(lines = 100, seed = 3)
+    for point in indexSplitPoints(data, ESC_Device().devProperties, 50):
+        ESCdevice = ESC_Device()
+        ESCdevice.process_bytearray(data[:point.offset])
+        assert type(ESCdevice.state).__name__ == 'IDLE' and len(ESCdevice.Boxes) == 0
+        properties = ESCdevice.devProperties
+        assert (properties.LineSpace, properties.boldFont, properties.italicFont) == (point.LineSpace, point.boldFont, point.italicFont)
+
+@pytest.mark.parametrize('file', ['02_Table2_protocol.esc', '07_Plot_Quench.esc', '09_Multi_Measurements.esc'])
+def test_sample_file(file):
+    fileName = os.path.join(folder, file)
+    with open(fileName, 'rb') as f:
+        data = f.read()
+    ESCdevice = ESC_Device()
+    Flowable = parseFileParallel(ESCdevice, fileName, workers = 2, segmentSize = 512)
+    assert ( list( map(fingerprint, Flowable) ), state(ESCdevice) ) == serial(data)
@@ -0,0 +1,53 @@
+"""
+    stitchBands() fuses stacked graphics bands, at line start or indented by equal blank text.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from esc2pdf import ESC_Device
+from esc2pdf.boxes import BandGraphicsBox, GraphicsBox, TextBox
+from esc2pdf.stitching import stitchBands
+
+folder = os.path.join(os.path.dirname(__file__), '..', 'examples', 'sample_binaries')
+
+def band(n):
+    return b'\x1bK\x04\x00' + bytes([n, n, n, n])
+
+def parse(data):
+    return ESC_Device().process_bytearray(b'\x1b3\x18' + data) # Linespace of one band (24/216 inch = 8 dots)
+
+def summary(Flowable):
+    # Type names, bands per BandGraphicsBox and text per TextBox
+    result = []
+    for box in Flowable:
+        if type(box) is BandGraphicsBox:
+            result.append( [ bytes(gData)[0] for gData in box.Bands ] )
+        elif type(box) is TextBox:
+            result.append( repr(box.Text) )
+        elif type(box) is GraphicsBox:
+            result.append( bytes(box.graphicsData)[0] )
+    return result
+
+def test_line_start():
+    Flowable = stitchBands( parse(band(1) + b'\r\n' + band(2) + b'\r\n' + band(3) + b'\r\n') )
+    assert summary(Flowable) == [ [1, 2, 3] ]
+
+def test_indented_plot():
+    # Plot indented by blank text, every band at the same x
+    data = b''.join( b'    ' + band(n) + b'\r\n' for n in (1, 2, 3) )
+    assert summary( stitchBands( parse(data) ) ) == [ "'    '", [1, 2, 3] ]
+
+def test_label_and_other_indentation_break_the_stack():
+    data = (b'    ' + band(1) + b'\r\n' + b'    ' + band(2) + b'\r\n' + b'0.00' + band(3) + b'\r\n' +
+            b'    ' + band(4) + b'\r\n' + b'  ' + band(5) + b'\r\n')
+    assert summary( stitchBands( parse(data) ) ) == [ "'    '", [1, 2], "'0.00'", 3, "'    '", 4, "'  '", 5 ]
+
+def test_sample_plots():
+    fused = {}
+    for file in ('04_Spectrum_1.esc', '06_Quenchcurve.esc', '07_Plot_Quench.esc'):
+        with open(os.path.join(folder, file), 'rb') as f:
+            Flowable = stitchBands( ESC_Device().process_bytearray(f.read()) )
+        fused[file] = sum( len(box.Bands) for box in Flowable if type(box) is BandGraphicsBox )
+    # 07_Plot_Quench: 61 bands indented by blank text or labels, the 7 labelled bands stay single
+    assert fused == {'04_Spectrum_1.esc': 80, '06_Quenchcurve.esc': 80, '07_Plot_Quench.esc': 54}